@@ -7,10 +7,19 @@ version = 0.1
 
 import pyglet
 rLoader = pyglet.resource.Loader()
+from appEngine.atlas import AtlasManager
+atlas = AtlasManager(rLoader)
+from appEngine.frames import FrameCache
+frames = FrameCache(atlas)
+from appEngine.registry import EntityRegistry
+entities = EntityRegistry(rLoader)
 
 def setResourcePath(path):
         rLoader.path = path
         rLoader.reindex()
+        atlas.clear()
+        frames.clear()
+        entities.clear()
 
 '''
 jolt = False
@@ -2,19 +2,30 @@
 
 '''
 import math
-import pyglet
 import pyglet.sprite as sprite
 import pymunk
 import appEngine
-from appEngine import rLoader
 
 def centerImgAnchor(img):
     img.anchor_x = img.width // 2
     img.anchor_y = img.height // 2
 
 
+'''
+    TickRate
+    how often the scene updates an actor, in updates a second,
+    or every scene update, or only when woken by an event.
+'''
+class TickRate(object):
+    EVERY_FRAME = 0
+    HZ_30 = 30
+    HZ_10 = 10
+    ON_EVENT = -1
+
+
 class Actor(object):
     Scene = None
+    tickRate = TickRate.EVERY_FRAME
 
     def update(self, dt):
         pass
@@ -60,6 +71,9 @@ class VisualActor(sprite.Sprite, Actor):
     def addedToScene(self, scene):
         super(VisualActor, self).addedToScene(scene)
         self.batch = scene.batch
+        group = getattr(scene, 'actorGroup', None)
+        if group is not None:
+            self.group = group
         
     def setState(self, state):
         if state != self.state.type:
@@ -71,43 +85,158 @@ class VisualActor(sprite.Sprite, Actor):
             self.direction = direction
             self.image = self.state.direction(self.direction)
         
-    def loadAnimation(self, imageName, rows, columns, animFreq, loop=False, centerAnchor=False):
-        animImg = rLoader.image(imageName)
-        tex = animImg.get_texture()
-        animGrid = pyglet.image.ImageGrid(tex, rows, columns)
-        animGrid = animGrid.get_texture_sequence()
-        if centerAnchor == True:
-            map(centerImgAnchor, animGrid)
-        anim = pyglet.image.Animation.from_image_sequence(animGrid,
-                animFreq, loop=loop)
-        return anim
+    def loadAnimation(self, imageName, rows, columns, animFreq, loop=False, centerAnchor=False,
+        flipX=False):
+        # shared with every actor asking for the same frames
+        return appEngine.frames.animation(imageName, rows, columns, animFreq, loop,
+            flipX, centerAnchor)
             
                 
 # PhysicalActor - Comprises a pymunk body and the common
 # calculations..
 #            
 class PhysicalActor(VisualActor):
+    # sprite isn't moved until the body has moved this many pixels
+    # or degrees from where the sprite was last put
+    MOVE_THRESHOLD = 0.25
+    ROTATE_THRESHOLD = 0.25
+    # whether the scene may suspend actor once it is far off screen
+    suspendable = True
+    
     def __init__(self, states, startState, batch=None, mass=5, moment=pymunk.inf):
         super(PhysicalActor, self).__init__(states, startState, batch=batch)
         self.body = pymunk.Body(mass, moment)
+        # lets queries and collisions find the actor of a body
+        self.body.actor = self
+        # shapes added to and removed from the space with body
+        self.shapes = []
+        # (x, y, rotation) sprite was last placed at
+        self.spriteState = None
+        self.resetInterpolation()
         
-    def unload():
+    def unload(self):
         super(PhysicalActor, self).unload()
         
     def update(self, dt):
-        self.rotation = math.degrees(self.body.angle)
+        pass
+        
+    def setposition(self, x, y):
+        self.body.position = x, y
+        # a teleport, don't slide from the old position
+        self.resetInterpolation()
+        
+    '''
+        body state of the previous physics step and the state
+        drawn this frame, blended between it and the current one
+    '''
+    def resetInterpolation(self):
+        position = self.body.position
+        self.prevPosition = (position[0], position[1])
+        self.prevAngle = self.body.angle
+        self.renderPosition = self.prevPosition
+        self.renderAngle = self.prevAngle
+        
+    def savePhysicsState(self):
+        position = self.body.position
+        self.prevPosition = (position[0], position[1])
+        self.prevAngle = self.body.angle
+        
+    def interpolate(self, alpha):
+        position = self.body.position
+        px, py = self.prevPosition
+        self.renderPosition = (px + (position[0] - px) * alpha,
+            py + (position[1] - py) * alpha)
+        self.renderAngle = self.prevAngle + (self.body.angle - self.prevAngle) * alpha
+        
+    def spriteOffset(self):
+        ''' offset of sprite position from body position '''
+        return (0, 0)
+        
+    '''
+        places sprite at the interpolated body state in world
+        coordinates, leaving its vertices alone if it hasn't
+        moved past the thresholds
+    '''
+    def updateSprite(self):
+        ox, oy = self.spriteOffset()
+        x = self.renderPosition[0] + ox
+        y = self.renderPosition[1] + oy
+        rotation = math.degrees(self.renderAngle)
+        last = self.spriteState
+        if last is not None and abs(x - last[0]) < self.MOVE_THRESHOLD and \
+            abs(y - last[1]) < self.MOVE_THRESHOLD and \
+            abs(rotation - last[2]) < self.ROTATE_THRESHOLD:
+            return
+        self.spriteState = (x, y, rotation)
+        if last is None or rotation != last[2]:
+            self.rotation = rotation
+        self.set_position(x, y)
         
     def addedToScene(self, scene):
         super(PhysicalActor, self).addedToScene(scene)
         if hasattr(scene, 'space'):
-            scene.space.add(self.body)
+            scene.space.add(self.body, *self.shapes)
+            
+    '''
+        takes body and shapes out of space, they keep their
+        position and velocity until resume puts them back
+    '''
+    def suspend(self, space):
+        if self.body.is_sleeping:
+            self.body.activate()
+        space.remove(self.body, *self.shapes)
+        
+    def resume(self, space):
+        space.add(self.body, *self.shapes)
 
 
 class CompositeActor():
     pass
     
-class EffectActor():
-    pass
+'''
+    class EffectActor
+    a particle effect placed in the scene. its emitter comes from
+    the scene's particle pool and goes back to it once the effect
+    is done, when the actor takes itself out of the scene.
+'''
+class EffectActor(Actor):
+    def __init__(self, definition, x=0, y=0):
+        self.definition = definition
+        self.x = x
+        self.y = y
+        self.emitter = None
+
+    def addedToScene(self, scene):
+        super(EffectActor, self).addedToScene(scene)
+        self.emitter = scene.particles.acquire(self.definition, self.x, self.y)
+
+    def setposition(self, x, y):
+        self.x = x
+        self.y = y
+        if self.emitter is not None:
+            self.emitter.x = x
+            self.emitter.y = y
+
+    def stop(self):
+        ''' stops spawning, the actor leaves once its particles die '''
+        if self.emitter is not None:
+            self.emitter.stop()
+
+    def update(self, dt):
+        if self.emitter is None:
+            return
+        self.emitter.update(dt)
+        if self.emitter.isDone():
+            self.scene.removeActor(self)
+
+    def removedFromScene(self, scene):
+        self.unload()
+        super(EffectActor, self).removedFromScene(scene)
+
+    def unload(self):
+        if self.emitter is not None:
+            self.emitter.pool.release(self.emitter)
+            self.emitter = None
     
     
     
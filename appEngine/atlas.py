@@ -0,0 +1,95 @@
+'''
+Runtime texture atlas.
+
+Packs the level images into a few large texture pages so the
+sprites of a layer share a texture and the batch can draw them
+without switching textures between items.
+'''
+from ctypes import byref
+
+import pyglet
+from pyglet.gl import GLint, glGetIntegerv, GL_MAX_TEXTURE_SIZE
+from pyglet.image.atlas import TextureAtlas, AllocatorException
+from appEngine.trace import tracer
+
+
+def sortForPacking(images):
+    ''' returns (name, image) pairs tallest first, so page rows fill evenly '''
+    return sorted(images, key=lambda (name, img): (img.height, img.width), reverse=True)
+
+
+'''
+    class AtlasManager
+    hands out atlas regions for images of a resource loader,
+    allocating new pages as the current ones fill up.
+'''
+class AtlasManager(object):
+    PAGE_SIZE = 2048
+    # transparent border kept around each image so scaled and
+    # rotated sprites don't sample their neighbours on the page
+    PADDING = 1
+
+    def __init__(self, loader, pageSize=PAGE_SIZE):
+        self.loader = loader
+        self.pageSize = pageSize
+        self.pages = []
+        self.regions = dict()
+
+    def _pageSize(self):
+        size = GLint()
+        glGetIntegerv(GL_MAX_TEXTURE_SIZE, byref(size))
+        if size.value > 0:
+            return min(self.pageSize, size.value)
+        return self.pageSize
+
+    def _newPage(self):
+        if not self.pages:
+            self.pageSize = self._pageSize()
+        page = TextureAtlas(self.pageSize, self.pageSize)
+        self.pages.append(page)
+        return page
+
+    def _pack(self, img):
+        pad = self.PADDING
+        width = img.width + pad * 2
+        height = img.height + pad * 2
+        if width > self.pageSize or height > self.pageSize:
+            # too big to share a page, gets a texture of its own
+            return img.get_texture()
+        for page in self.pages:
+            try:
+                x, y = page.allocator.alloc(width, height)
+                break
+            except AllocatorException:
+                pass
+        else:
+            page = self._newPage()
+            x, y = page.allocator.alloc(width, height)
+        page.texture.blit_into(img, x + pad, y + pad, 0)
+        return page.texture.get_region(x + pad, y + pad, img.width, img.height)
+
+    def image(self, name):
+        ''' returns the atlas region holding the named resource image '''
+        try:
+            return self.regions[name]
+        except KeyError:
+            tracer.begin("decode", "asset", {'image': name})
+            try:
+                img = pyglet.image.load(name, file=self.loader.file(name))
+            finally:
+                tracer.end("decode", "asset")
+            return self.add(name, img)
+
+    def add(self, name, img):
+        ''' packs an already decoded image under name, returns its region '''
+        tracer.begin("upload", "asset", {'image': name})
+        try:
+            region = self.regions[name] = self._pack(img)
+        finally:
+            tracer.end("upload", "asset")
+        return region
+
+    def clear(self):
+        ''' drops every page, sprites still using them keep them alive '''
+        self.pages = []
+        self.regions = dict()
@@ -0,0 +1,87 @@
+'''
+Physics broadphase configuration.
+
+Chipmunk finds candidate collisions with a bounding box tree by
+default. A spatial hash can be faster for levels made of many
+similar sized static segments, if its cells are sized to them.
+'''
+import math
+from pymunk import _chipmunk as cp
+
+BBTREE = 'bbtree'
+SPATIAL_HASH = 'hash'
+KINDS = (BBTREE, SPATIAL_HASH)
+
+# bounds of the tuned hash cell size
+MIN_CELL_SIZE = 32
+MAX_CELL_SIZE = 1024
+# chipmunk suggests around ten hash cells per shape
+CELLS_PER_SHAPE = 10
+MIN_CELL_COUNT = 1000
+
+
+def tuneSpatialHash(width, height, lines, radius=0):
+    '''
+        returns (cell size, cell count) for a spatial hash over a
+        width by height level holding given (x1, y1, x2, y2) lines
+        as segments of radius. cells are sized to the average
+        segment bounds, and there are enough of them to keep the
+        shapes from crowding into the same buckets.
+    '''
+    count = 0
+    total = 0.
+    for x1, y1, x2, y2 in lines:
+        count += 1
+        total += max(abs(x2 - x1), abs(y2 - y1)) + radius * 2
+    if count == 0:
+        cellSize = MAX_CELL_SIZE
+    else:
+        cellSize = min(MAX_CELL_SIZE, max(MIN_CELL_SIZE, total / count))
+    # no point having more cells than the level can fill
+    levelCells = int(math.ceil(width / cellSize) * math.ceil(height / cellSize))
+    cellCount = max(MIN_CELL_COUNT, min(count * CELLS_PER_SHAPE, levelCells * 2))
+    return int(cellSize), int(cellCount)
+
+
+'''
+    class Broadphase
+    which broadphase a space should use, and for a spatial hash
+    its cell size and count. sizes left as None are tuned from the
+    level when applied.
+'''
+class Broadphase(object):
+    def __init__(self, kind=BBTREE, cellSize=None, cellCount=None):
+        if kind not in KINDS:
+            raise ValueError("unknown broadphase %r, expected one of %s" % (kind, ", ".join(KINDS)))
+        self.kind = kind
+        self.cellSize = cellSize
+        self.cellCount = cellCount
+        # settings actually given to the space by apply
+        self.applied = None
+
+    '''
+        configures space for a width by height level of given
+        static lines, returns the applied settings.
+    '''
+    def apply(self, space, width, height, lines, radius=0):
+        if self.kind == BBTREE:
+            # chipmunk default, nothing to switch
+            self.applied = (BBTREE,)
+            return self.applied
+        cellSize, cellCount = self.cellSize, self.cellCount
+        if cellSize is None or cellCount is None:
+            tunedSize, tunedCount = tuneSpatialHash(width, height, lines, radius)
+            if cellSize is None:
+                cellSize = tunedSize
+            if cellCount is None:
+                cellCount = tunedCount
+        # pymunk 3 has no wrapper, the call rebuilds both the static
+        # and active indexes, moving any shapes already added.
+        cp.cpSpaceUseSpatialHash(space._space, cellSize, cellCount)
+        self.applied = (SPATIAL_HASH, cellSize, cellCount)
+        return self.applied
+
+    def __repr__(self):
+        if self.kind == BBTREE:
+            return "Broadphase(%r)" % self.kind
+        return "Broadphase(%r, %r, %r)" % (self.kind, self.cellSize, self.cellCount)
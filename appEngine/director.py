@@ -6,19 +6,40 @@ and other general stuff.
 import pyglet
 from pyglet.window import key
 from pyglet.gl import *
+import appEngine
 import actor
+from appEngine import preloader
+from appEngine.preloader import Preloader
+from appEngine.timing import timings, TimingOverlay
+from appEngine.trace import tracer
 
 
 class Director(pyglet.window.Window):
 	currentScene = None
 	scenes = dict()
+	# seconds a frame may spend uploading preloaded images
+	UPLOAD_BUDGET = preloader.UPLOAD_BUDGET
+	# toggles the fps and timing display
+	TIMINGS_KEY = key.F3
+	# writes the trace so far, when tracing
+	TRACE_KEY = key.F4
 
 	def __init__(self, (width, height), showFps=False, windowCaption="Py2d"):
 		super(Director, self).__init__(width, height, windowCaption, vsync = False)
 		self.keys = key.KeyStateHandler()
 		self.push_handlers(self.keys)
 		self.fpsDisplay = pyglet.clock.ClockDisplay()
-		self.showFps = showFps
+		self.timingOverlay = TimingOverlay(timings, notes=self.schedulerReport)
+		self.setShowFps(showFps)
+		self.preloader = None
+		self.loadingScene = None
+		self.loadingLabel = None
+	
+	def schedulerReport(self):
+		''' the current scene's actor updates of the last tick '''
+		if self.currentScene is None:
+			return ""
+		return self.currentScene.scheduler.report()
 	
 	def registerScene(self, scene):
 	    self.scenes[scene.name] = scene
@@ -29,14 +50,80 @@ class Director(pyglet.window.Window):
 			if self.currentScene.loaded == False:
 				self.currentScene.load()
 	
+	'''
+		finds and decodes the images the named scene needs on worker
+		threads and uploads them a little each frame, then switches to
+		the scene. on_load_progress(fraction) is dispatched every frame
+		of the load and on_load_complete(sceneName) once the scene is
+		current.
+	'''
+	def loadScene(self, sceneName, workers=preloader.WORKERS):
+		scene = self.scenes[sceneName]
+		# the scene lists its images on a worker, which for a level
+		# means reading the level file there too
+		self.preloader = Preloader(appEngine.atlas, scene.assets, workers)
+		self.loadingScene = sceneName
+		if self.loadingLabel is None:
+			self.loadingLabel = pyglet.text.Label("", x=self.width // 2, y=self.height // 2,
+				anchor_x='center', anchor_y='center')
+		self.on_load_progress(0.)
+		self.preloader.start()
+		pyglet.clock.schedule(self.updateLoading)
+		
+	def updateLoading(self, dt):
+		tracer.begin("preloader step", "asset")
+		done = self.preloader.step(self.UPLOAD_BUDGET)
+		tracer.end("preloader step", "asset")
+		self.dispatch_event('on_load_progress', self.preloader.progress())
+		if done:
+			pyglet.clock.unschedule(self.updateLoading)
+			self.preloader = None
+			sceneName = self.loadingScene
+			self.loadingScene = None
+			self.switchToScene(sceneName)
+			self.dispatch_event('on_load_complete', sceneName)
+			
+	def on_load_progress(self, fraction):
+		''' default loading display, push a handler to replace it '''
+		self.loadingLabel.text = "loading %d%%" % (fraction * 100)
+		
+	def on_load_complete(self, sceneName):
+		pass
+	
+	def setShowFps(self, value):
+		''' shows the fps and timing display, timing spans only while shown '''
+		self.showFps = value
+		timings.setEnabled(value)
+		
+	def on_key_press(self, symbol, modifiers):
+		if symbol == self.TIMINGS_KEY:
+			self.setShowFps(not self.showFps)
+			return pyglet.event.EVENT_HANDLED
+		if symbol == self.TRACE_KEY and tracer.filename is not None:
+			tracer.dump()
+			return pyglet.event.EVENT_HANDLED
+		return super(Director, self).on_key_press(symbol, modifiers)
+	
 	def update(self, dt):
-		self.currentScene.update(dt)
+		if self.currentScene is not None:
+			timings.begin('update')
+			self.currentScene.update(dt)
+			timings.end('update')
 		
 	def on_draw(self):
+		tracer.begin("Director.on_draw", "frame")
 		self.clear()
-		self.currentScene.batch.draw()
-		if self.showFps == True:
-			self.fpsDisplay.draw()
+		if self.preloader is not None:
+			self.loadingLabel.draw()
+		else:
+			timings.begin('draw')
+			self.currentScene.batch.draw()
+			timings.end('draw')
+			if self.showFps == True:
+				self.fpsDisplay.draw()
+				self.timingOverlay.draw()
+			timings.frameDone()
+		tracer.end("Director.on_draw", "frame")
 			
 	def on_resize(self, width, height):
 		v_ar = width/float(height)
@@ -62,6 +149,14 @@ class Director(pyglet.window.Window):
 		#glRotatef(45, 1.0, 0.0, 0.0)
 		return pyglet.event.EVENT_HANDLED
 		
-	def run(self, updateFreq=1/60.0):
-		pyglet.clock.schedule_interval(self.update, updateFreq)
+	def run(self, updateFreq=None):
+		# by default the scene updates once a frame and keeps its own
+		# simulation rate, so frame rate is only limited by the clock
+		if updateFreq is None:
+			pyglet.clock.schedule(self.update)
+		else:
+			pyglet.clock.schedule_interval(self.update, updateFreq)
 		pyglet.app.run()
+
+Director.register_event_type('on_load_progress')
+Director.register_event_type('on_load_complete')
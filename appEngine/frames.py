@@ -0,0 +1,87 @@
+'''
+Shared actor frames.
+
+Actors of one kind all draw the same images, so the regions,
+animations and state tables they use are built once here and the
+same objects handed to every instance. Frames from the cache are
+shared, actors must not change their anchors or other attributes.
+'''
+import pyglet
+
+
+def _centerAnchor(img):
+    img.anchor_x = img.width // 2
+    img.anchor_y = img.height // 2
+
+
+'''
+    class FrameCache
+    images and animations cut from the images of an atlas, keyed by
+    the image name and the options they were made with, and state
+    tables keyed by whatever their builder is given for.
+'''
+class FrameCache(object):
+    def __init__(self, atlas):
+        self.atlas = atlas
+        self.images = dict()
+        self.animations = dict()
+        self.tables = dict()
+
+    def image(self, name, region=None, flipX=False, centerAnchor=False):
+        '''
+            returns the named image, or the (x, y, width, height) region
+            of it, flipped horizontally and then anchored on its centre
+            as asked.
+        '''
+        key = (name, region, flipX, centerAnchor)
+        try:
+            return self.images[key]
+        except KeyError:
+            img = self.atlas.image(name)
+            if region is not None:
+                img = img.get_region(*region)
+            elif flipX or centerAnchor:
+                # own region, so the anchor of the atlas image stays put
+                img = img.get_region(0, 0, img.width, img.height)
+            if flipX:
+                img = img.get_transform(flip_x=True)
+            if centerAnchor:
+                _centerAnchor(img)
+            self.images[key] = img
+            return img
+
+    def animation(self, name, rows, columns, period, loop=False, flipX=False, centerAnchor=False):
+        '''
+            returns an animation of the frames of the named image cut
+            into a rows by columns grid, each shown for period seconds.
+            frames are anchored on their centre as asked and then the
+            whole animation flipped horizontally.
+        '''
+        key = (name, rows, columns, period, loop, flipX, centerAnchor)
+        try:
+            return self.animations[key]
+        except KeyError:
+            if flipX:
+                anim = self.animation(name, rows, columns, period, loop, False,
+                    centerAnchor).get_transform(flip_x=True)
+            else:
+                grid = pyglet.image.ImageGrid(self.atlas.image(name), rows, columns)
+                sequence = grid.get_texture_sequence()
+                if centerAnchor:
+                    map(_centerAnchor, sequence)
+                anim = pyglet.image.Animation.from_image_sequence(sequence, period, loop=loop)
+            self.animations[key] = anim
+            return anim
+
+    def states(self, key, build):
+        ''' returns the state table built by build() for key, building it once '''
+        try:
+            return self.tables[key]
+        except KeyError:
+            table = self.tables[key] = build()
+            return table
+
+    def clear(self):
+        self.images = dict()
+        self.animations = dict()
+        self.tables = dict()
@@ -0,0 +1,447 @@
+'''
+Level file reading and writing.
+
+LevelData is the in memory form of a level, independent of the
+scene graph: packed arrays of terrain line coordinates and item
+records with a string table for item and layer names. It is read
+from the xml .lvl format or from the compiled .lvlc format, which
+stores the same arrays as raw little endian data behind a header
+carrying the hash of the xml source it was compiled from.
+'''
+import os
+import sys
+import mmap
+import struct
+import hashlib
+from array import array
+import xml.etree.ElementTree as ET
+
+
+class FileLoadFailedException(Exception):
+    """failed to load level file"""
+    def __init__(self, msg):
+        self.msg = msg
+
+
+'''
+    class ItemArrays
+    parallel arrays of item name ids, positions, scales and rotations
+'''
+class ItemArrays(object):
+    def __init__(self):
+        self.names = array('I')
+        self.xs = array('i')
+        self.ys = array('i')
+        # doubles, so values read from the xml come back exactly
+        # and saving a loaded level doesn't rewrite them
+        self.scales = array('d')
+        self.rots = array('d')
+
+    def __len__(self):
+        return len(self.names)
+
+    def append(self, nameId, x, y, scale, rot):
+        self.names.append(nameId)
+        self.xs.append(x)
+        self.ys.append(y)
+        self.scales.append(scale)
+        self.rots.append(rot)
+
+    def arrays(self):
+        return (self.names, self.xs, self.ys, self.scales, self.rots)
+
+
+'''
+    class LevelData
+'''
+class LevelData(object):
+    def __init__(self, name="", width=0, height=0):
+        self.name = name
+        self.width = width
+        self.height = height
+        self.strings = []
+        self.stringIds = dict()
+        # x1, y1, x2, y2 for each terrain line
+        self.terrain = array('i')
+        self.objects = ItemArrays()
+        # [(layer name id, ItemArrays)] in file order
+        self.aesthetics = []
+
+    def stringId(self, s):
+        try:
+            return self.stringIds[s]
+        except KeyError:
+            i = self.stringIds[s] = len(self.strings)
+            self.strings.append(s)
+            return i
+
+    def addLine(self, x1, y1, x2, y2):
+        self.terrain.extend((x1, y1, x2, y2))
+
+    def addObject(self, name, x, y, scale, rot):
+        self.objects.append(self.stringId(name), x, y, scale, rot)
+
+    def addAestheticLayer(self, name):
+        items = ItemArrays()
+        self.aesthetics.append((self.stringId(name), items))
+        return items
+
+    def addAesthetic(self, items, name, x, y, scale, rot):
+        items.append(self.stringId(name), x, y, scale, rot)
+
+    def lines(self):
+        t = self.terrain
+        for i in xrange(0, len(t), 4):
+            yield t[i], t[i+1], t[i+2], t[i+3]
+
+    def items(self, items):
+        ''' yields (name, x, y, scale, rot) of given item arrays '''
+        strings = self.strings
+        names, xs, ys, scales, rots = items.arrays()
+        for i in xrange(len(names)):
+            yield strings[names[i]], xs[i], ys[i], scales[i], rots[i]
+
+    @classmethod
+    def fromGraph(cls, graph):
+        ''' builds level data from the current content of a scene graph '''
+        data = cls(graph.name, graph.width, graph.height)
+        for line in graph.layers['terrain'].lines:
+            data.addLine(int(line.x1), int(line.y1), int(line.x2), int(line.y2))
+        for item in graph.layers['object'].items:
+            data.addObject(item.name, int(item.x), int(item.y), item.scale, item.rot)
+        for layer in graph.layers:
+            if layer.name != "terrain" and \
+                layer.name != "object" and \
+                len(layer.items) > 0:
+                items = data.addAestheticLayer(layer.name)
+                for item in layer.items:
+                    data.addAesthetic(items, item.name, int(item.x), int(item.y), item.scale, item.rot)
+        return data
+
+
+'''
+    xml format
+    parsed as a stream with iterparse. line and item elements are
+    turned into LevelData records as soon as they end and are then
+    dropped, so the whole document is never held in memory.
+'''
+class _LineTreeBuilder(ET.TreeBuilder):
+    ''' tree builder noting the source line each element starts on '''
+    def __init__(self):
+        ET.TreeBuilder.__init__(self)
+        self.expat = None
+        self.lines = dict()
+
+    def start(self, tag, attrs):
+        elem = ET.TreeBuilder.start(self, tag, attrs)
+        self.lines[elem] = self.expat.CurrentLineNumber
+        return elem
+
+
+class _XmlLevelParser(object):
+    def __init__(self, filename):
+        self.filename = filename
+        self.builder = _LineTreeBuilder()
+        self.data = None
+        self.map = None
+        self.mapChildren = 0
+        self.items = None # item arrays of current aesthetic layer
+
+    def error(self, elem, msg):
+        line = self.builder.lines.get(elem)
+        if line is None:
+            return FileLoadFailedException("%s: %s" % (self.filename, msg))
+        return FileLoadFailedException("%s, line %d: %s" % (self.filename, line, msg))
+
+    def attrib(self, elem, name):
+        value = elem.get(name)
+        if value is None:
+            raise self.error(elem, "<%s> is missing attribute '%s'" % (elem.tag, name))
+        return value
+
+    def intAttrib(self, elem, name):
+        value = self.attrib(elem, name)
+        try:
+            return int(value)
+        except ValueError:
+            raise self.error(elem, "<%s> attribute '%s' is not an integer: %r" % (elem.tag, name, value))
+
+    def floatText(self, elem):
+        try:
+            return float(elem.text)
+        except (TypeError, ValueError):
+            raise self.error(elem, "<%s> is not a number: %r" % (elem.tag, elem.text))
+
+    def release(self, parent, elem):
+        ''' drops a processed element from the partial tree '''
+        if parent is not None:
+            parent.remove(elem)
+        lines = self.builder.lines
+        for e in elem.iter():
+            lines.pop(e, None)
+        elem.clear()
+
+    def parse(self):
+        parser = ET.XMLParser(target=self.builder)
+        self.builder.expat = parser.parser
+        stack = []
+        try:
+            for event, elem in ET.iterparse(self.filename, ('start', 'end'), parser):
+                if event == 'start':
+                    self.start(elem, len(stack))
+                    stack.append(elem)
+                else:
+                    stack.pop()
+                    parent = stack[-1] if stack else None
+                    self.end(elem, len(stack), parent)
+        except ET.ParseError as err:
+            raise FileLoadFailedException("%s: %s" % (self.filename, err))
+        return self.data
+
+    def start(self, elem, depth):
+        if depth == 0:
+            if elem.tag != 'map':
+                raise self.error(elem, "root element is <%s>, expected <map>" % elem.tag)
+            self.map = elem
+            self.width = self.intAttrib(elem, 'width')
+            self.height = self.intAttrib(elem, 'height')
+        elif depth == 1:
+            expected = ('head', 'layers')
+            if self.mapChildren >= len(expected):
+                raise self.error(elem, "unexpected <%s> after <layers>" % elem.tag)
+            if elem.tag != expected[self.mapChildren]:
+                raise self.error(elem, "found <%s>, expected <%s>" % (elem.tag, expected[self.mapChildren]))
+            self.mapChildren += 1
+        elif depth == 2 and self.mapChildren == 2:
+            # layer, anything that isn't terrain or objects is aesthetic
+            if elem.tag != 'terrainlayer' and elem.tag != 'objectlayer':
+                self.items = self.data.addAestheticLayer(self.attrib(elem, 'name'))
+
+    def end(self, elem, depth, parent):
+        if depth == 0:
+            if self.mapChildren < 2:
+                raise self.error(elem, "<map> is missing <head> or <layers>")
+            self.release(None, elem)
+        elif depth == 1:
+            if elem.tag == 'head':
+                self.endHead(elem)
+            self.release(parent, elem)
+        elif self.mapChildren < 2:
+            pass # inside <head>, read when it ends
+        elif depth == 2:
+            self.items = None
+            self.release(parent, elem)
+        elif depth == 3:
+            if parent.tag == 'terrainlayer':
+                self.data.addLine(self.intAttrib(elem, 'x1'), self.intAttrib(elem, 'y1'),
+                    self.intAttrib(elem, 'x2'), self.intAttrib(elem, 'y2'))
+            elif parent.tag == 'objectlayer':
+                self.data.addObject(self.attrib(elem, 'name'), self.intAttrib(elem, 'x'),
+                    self.intAttrib(elem, 'y'), 1.0, 0.0)
+            else:
+                self.endItem(elem)
+            self.release(parent, elem)
+
+    def endHead(self, elem):
+        mapName = None
+        for child in elem:
+            if child.tag == 'name':
+                mapName = child.text
+        if mapName is None:
+            raise self.error(elem, "<head> has no <name>")
+        self.data = LevelData(mapName, self.width, self.height)
+
+    def endItem(self, elem):
+        rot = 0
+        scale = 1.0
+        for c in elem:
+            if c.tag == "rotation":
+                # compiled levels keep rotation as float, so
+                # graphs saved from them write "65.0"
+                rot = self.floatText(c)
+            if c.tag == "scale":
+                scale = self.floatText(c)
+        self.data.addAesthetic(self.items, self.attrib(elem, 'name'), self.intAttrib(elem, 'x'),
+            self.intAttrib(elem, 'y'), scale, rot)
+
+
+def parseXml(filename):
+    '''
+        returns LevelData parsed from xml level file, raising
+        FileLoadFailedException with the offending line if the
+        file is not a valid level.
+    '''
+    return _XmlLevelParser(filename).parse()
+
+
+'''
+    compiled format
+    all values little endian:
+        header      magic, version, sha1 of xml source
+        head        width, height, name string id
+        strings     count, then (byte length, utf8 bytes) each
+        terrain     line count, then x1 y1 x2 y2 int32 each
+        objects     item block
+        aesthetics  layer count, then (name id, item block) each
+    an item block is a count followed by the uint32 name id, int32 x, y
+    and float64 scale and rotation arrays.
+'''
+MAGIC = 'LVLC'
+# 2 stores scales and rotations as doubles
+VERSION = 2
+_header = struct.Struct('<4sH20s')
+_head = struct.Struct('<iiI')
+_count = struct.Struct('<I')
+_length = struct.Struct('<H')
+
+def sourceHash(filename):
+    h = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(65536), ''):
+            h.update(block)
+    return h.digest()
+
+def _packArray(out, a):
+    if sys.byteorder != 'little':
+        a = array(a.typecode, a)
+        a.byteswap()
+    out.append(a.tostring())
+
+def _writeItems(out, items):
+    out.append(_count.pack(len(items)))
+    for a in items.arrays():
+        _packArray(out, a)
+
+def writeCompiled(data, filename, srcHash='\0' * 20):
+    out = [_header.pack(MAGIC, VERSION, srcHash),
+        _head.pack(data.width, data.height, data.stringId(data.name or ""))]
+    out.append(_count.pack(len(data.strings)))
+    for s in data.strings:
+        b = s.encode('utf-8')
+        out.append(_length.pack(len(b)))
+        out.append(b)
+    out.append(_count.pack(len(data.terrain) // 4))
+    _packArray(out, data.terrain)
+    _writeItems(out, data.objects)
+    out.append(_count.pack(len(data.aesthetics)))
+    for nameId, items in data.aesthetics:
+        out.append(_count.pack(nameId))
+        _writeItems(out, items)
+    # write next to the target and rename so readers never
+    # see a half written file
+    tmp = filename + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(''.join(out))
+    if os.path.exists(filename):
+        os.remove(filename)
+    os.rename(tmp, filename)
+
+
+class _Reader(object):
+    def __init__(self, buf):
+        self.buf = buf
+        self.offset = 0
+
+    def unpack(self, st):
+        end = self.offset + st.size
+        if end > len(self.buf):
+            raise FileLoadFailedException("compiled level is truncated")
+        values = st.unpack(self.buf[self.offset:end])
+        self.offset = end
+        return values
+
+    def bytes(self, n):
+        end = self.offset + n
+        if end > len(self.buf):
+            raise FileLoadFailedException("compiled level is truncated")
+        b = self.buf[self.offset:end]
+        self.offset = end
+        return b
+
+    def array(self, typecode, count):
+        a = array(typecode)
+        a.fromstring(self.bytes(count * a.itemsize))
+        if sys.byteorder != 'little':
+            a.byteswap()
+        return a
+
+    def items(self):
+        (count,) = self.unpack(_count)
+        items = ItemArrays()
+        items.names = self.array('I', count)
+        items.xs = self.array('i', count)
+        items.ys = self.array('i', count)
+        items.scales = self.array('d', count)
+        items.rots = self.array('d', count)
+        return items
+
+
+def readCompiledHash(filename):
+    ''' returns the source hash stored in a compiled level '''
+    with open(filename, 'rb') as f:
+        header = f.read(_header.size)
+    if len(header) != _header.size:
+        return None
+    magic, version, srcHash = _header.unpack(header)
+    if magic != MAGIC or version != VERSION:
+        return None
+    return srcHash
+
+def readCompiled(filename):
+    with open(filename, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise FileLoadFailedException("compiled level is empty")
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            r = _Reader(buf)
+            magic, version, srcHash = r.unpack(_header)
+            if magic != MAGIC or version != VERSION:
+                raise FileLoadFailedException("not a compiled level: " + filename)
+            width, height, nameId = r.unpack(_head)
+            (count,) = r.unpack(_count)
+            strings = []
+            for i in xrange(count):
+                (length,) = r.unpack(_length)
+                strings.append(r.bytes(length).decode('utf-8'))
+            data = LevelData(None, width, height)
+            data.strings = strings
+            data.stringIds = dict((s, i) for i, s in enumerate(strings))
+            data.name = strings[nameId]
+            (count,) = r.unpack(_count)
+            data.terrain = r.array('i', count * 4)
+            data.objects = r.items()
+            (count,) = r.unpack(_count)
+            for i in xrange(count):
+                (nameId,) = r.unpack(_count)
+                data.aesthetics.append((nameId, r.items()))
+        finally:
+            buf.close()
+    return data
+
+
+def compiledPath(filename):
+    return filename + 'c'
+
+def load(filename, useCache=True):
+    '''
+        returns LevelData of a .lvl or .lvlc file. for xml levels a
+        compiled sidecar is used when its hash matches the source,
+        and regenerated when it doesn't.
+    '''
+    if filename.endswith('.lvlc'):
+        return readCompiled(filename)
+    if not useCache:
+        return parseXml(filename)
+    srcHash = sourceHash(filename)
+    cache = compiledPath(filename)
+    if os.path.exists(cache) and readCompiledHash(cache) == srcHash:
+        try:
+            return readCompiled(cache)
+        except FileLoadFailedException:
+            pass # corrupt cache, rebuild it
+    data = parseXml(filename)
+    try:
+        writeCompiled(data, cache, srcHash)
+    except (IOError, OSError) as err:
+        print "could not write level cache: " + str(err)
+    return data
@@ -0,0 +1,210 @@
+'''
+Particle effects.
+
+Particle state lives in numpy arrays, one row per particle, and is
+integrated for every particle of an emitter at once. Each emitter
+draws from a single quad vertex list written straight from those
+arrays, so no python object exists per particle.
+'''
+import numpy
+from pyglet.gl import GL_QUADS
+
+# live particles allowed across every emitter of a pool
+MAX_PARTICLES = 50000
+
+
+'''
+    class EmitterDef
+    what an emitter spawns. ranges are (low, high) and each particle
+    takes a uniform random value from them. angle is in degrees,
+    spread the width of the cone around it. colors are rgba 0-255,
+    faded from start to end over each particle's life.
+'''
+class EmitterDef(object):
+    def __init__(self, rate=100., life=(0.5, 1.), speed=(50., 100.), angle=90.,
+        spread=360., gravity=(0., 0.), size=2., startColor=(255, 255, 255, 255),
+        endColor=(255, 255, 255, 0), capacity=1000, duration=None, burst=0):
+        # particles spawned a second, and at once when started
+        self.rate = rate
+        self.burst = burst
+        self.life = life
+        self.speed = speed
+        self.angle = angle
+        self.spread = spread
+        self.gravity = gravity
+        # half the width of each particle's quad
+        self.size = size
+        self.startColor = startColor
+        self.endColor = endColor
+        # most particles one emitter of this def holds alive
+        self.capacity = capacity
+        # seconds the emitter spawns for, None for until stopped
+        self.duration = duration
+
+
+'''
+    class Emitter
+    the particles of one effect. live particles are packed at the
+    front of the arrays, dead ones are compacted out each update.
+'''
+class Emitter(object):
+    def __init__(self, pool, definition):
+        self.pool = pool
+        self.definition = definition
+        capacity = definition.capacity
+        self.position = numpy.zeros((capacity, 2), numpy.float32)
+        self.velocity = numpy.zeros((capacity, 2), numpy.float32)
+        self.life = numpy.zeros(capacity, numpy.float32)
+        self.maxLife = numpy.ones(capacity, numpy.float32)
+        self.startColor = numpy.array(definition.startColor, numpy.float32)
+        self.colorRange = numpy.array(definition.endColor, numpy.float32) - self.startColor
+        # quad corner offsets from a particle's position
+        s = definition.size
+        self.corners = numpy.array(((-s, -s), (s, -s), (s, s), (-s, s)), numpy.float32)
+        self.vl = pool.batch.add(capacity * 4, GL_QUADS, pool.group,
+            ('v2f/stream', [0.] * (capacity * 8)), 'c4B/stream')
+        self.count = 0
+        # particles drawn by the last write, dead ones get collapsed
+        self.drawnCount = 0
+        self.reset(0, 0)
+
+    def reset(self, x, y):
+        self.x = x
+        self.y = y
+        self.age = 0.
+        self.spawnCredit = 0.
+        # the burst goes out on the first update, whatever the duration
+        self.burstPending = True
+        self.spawning = True
+
+    def stop(self):
+        ''' stops spawning, live particles play out '''
+        self.spawning = False
+
+    def isDone(self):
+        return self.spawning == False and self.count == 0
+
+    def kill(self):
+        self.pool.live -= self.count
+        self.count = 0
+        self.spawning = False
+        self.writeVertices()
+
+    def spawn(self, n):
+        n = self.pool.reserve(min(n, self.definition.capacity - self.count))
+        if n <= 0:
+            return 0
+        d = self.definition
+        start = self.count
+        end = start + n
+        angles = numpy.radians(d.angle + numpy.random.uniform(-d.spread / 2., d.spread / 2., n))
+        speeds = numpy.random.uniform(d.speed[0], d.speed[1], n)
+        self.position[start:end] = (self.x, self.y)
+        self.velocity[start:end, 0] = numpy.cos(angles) * speeds
+        self.velocity[start:end, 1] = numpy.sin(angles) * speeds
+        life = numpy.random.uniform(d.life[0], d.life[1], n)
+        self.life[start:end] = life
+        self.maxLife[start:end] = life
+        self.count = end
+        return n
+
+    def update(self, dt):
+        d = self.definition
+        n = self.count
+        if n:
+            life = self.life[:n]
+            life -= dt
+            alive = life > 0
+            dead = n - int(numpy.count_nonzero(alive))
+            if dead:
+                n -= dead
+                for values in (self.position, self.velocity, self.life, self.maxLife):
+                    values[:n] = values[:self.count][alive]
+                self.pool.live -= dead
+                self.count = n
+            velocity = self.velocity[:n]
+            velocity += numpy.array(d.gravity, numpy.float32) * dt
+            self.position[:n] += velocity * dt
+        if self.spawning:
+            if self.burstPending == True:
+                self.burstPending = False
+                self.spawn(d.burst)
+            self.age += dt
+            if d.duration is not None and self.age >= d.duration:
+                self.spawning = False
+            else:
+                self.spawnCredit += d.rate * dt
+                spawned = int(self.spawnCredit)
+                if spawned:
+                    self.spawnCredit -= spawned
+                    self.spawn(spawned)
+        self.writeVertices()
+
+    def writeVertices(self):
+        n = self.count
+        drawn = max(n, self.drawnCount)
+        self.drawnCount = n
+        if drawn == 0:
+            return
+        # numpy views straight onto the mapped vertex list regions
+        vertices = numpy.ctypeslib.as_array(self.vl.vertices).reshape(-1, 4, 2)
+        vertices[:n] = self.position[:n, numpy.newaxis, :] + self.corners
+        vertices[n:drawn] = 0
+        if n:
+            colors = numpy.ctypeslib.as_array(self.vl.colors).reshape(-1, 4, 4)
+            fade = 1. - self.life[:n] / self.maxLife[:n]
+            rgba = self.startColor + fade[:, numpy.newaxis] * self.colorRange
+            colors[:n] = rgba.astype(numpy.uint8)[:, numpy.newaxis, :]
+
+    def delete(self):
+        self.vl.delete()
+        self.vl = None
+
+
+'''
+    class ParticlePool
+    owns the emitters drawn in one batch and group. emitters given
+    back are kept, keyed by their def, and handed out again rather
+    than allocating new arrays and vertex lists. no more than limit
+    particles are alive at once across all of them.
+'''
+class ParticlePool(object):
+    def __init__(self, batch, group=None, limit=MAX_PARTICLES):
+        self.batch = batch
+        self.group = group
+        self.limit = limit
+        self.live = 0
+        self.emitters = set()
+        self.free = dict()
+
+    def reserve(self, n):
+        ''' returns how many of n new particles fit under the limit '''
+        n = max(0, min(n, self.limit - self.live))
+        self.live += n
+        return n
+
+    def acquire(self, definition, x, y):
+        free = self.free.get(definition)
+        if free:
+            emitter = free.pop()
+        else:
+            emitter = Emitter(self, definition)
+        emitter.reset(x, y)
+        self.emitters.add(emitter)
+        return emitter
+
+    def release(self, emitter):
+        emitter.kill()
+        self.emitters.discard(emitter)
+        self.free.setdefault(emitter.definition, []).append(emitter)
+
+    def clear(self):
+        ''' deletes every emitter, in use or free '''
+        for emitter in self.emitters:
+            emitter.delete()
+        for free in self.free.itervalues():
+            for emitter in free:
+                emitter.delete()
+        self.emitters = set()
+        self.free = dict()
+        self.live = 0
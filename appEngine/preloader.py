@@ -0,0 +1,155 @@
+'''
+Background asset preloading.
+
+Images are decoded from their files on worker threads, which need
+no GL context, while the main thread keeps drawing. Decoded images
+are then packed into the atlas, which uploads them to GL, a few at
+a time within a time budget each frame so the window stays
+responsive throughout. Workers only read files and decode, nothing
+they do touches GL.
+'''
+import sys
+import threading
+import Queue
+from timeit import default_timer as clock
+import pyglet
+from appEngine.atlas import sortForPacking
+from appEngine.trace import tracer
+
+WORKERS = 2
+# seconds of atlas uploads done per step
+UPLOAD_BUDGET = 0.004
+
+
+'''
+    class Preloader
+    decodes the named resource images of an atlas's loader and packs
+    them into it. names may also be a function returning them, which
+    is called on a worker first, so finding them, such as parsing a
+    level file, is off the main thread too. start() starts the
+    workers, then step() is called from the main thread until it
+    returns True.
+'''
+class Preloader(object):
+    def __init__(self, atlas, names, workers=WORKERS):
+        self.atlas = atlas
+        self.loader = atlas.loader
+        self.maxWorkers = workers
+        self.listNames = None
+        self.names = []
+        self.total = 0
+        # whether names are still being found
+        self.listing = False
+        # exc_info of listNames failing, raised again by step
+        self.listError = None
+        if callable(names):
+            self.listNames = names
+            self.listing = True
+        else:
+            self.setNames(names)
+        self.workers = []
+        self.todo = Queue.Queue()
+        self.results = Queue.Queue()
+        self.decoded = []
+        self.received = 0
+        self.uploaded = 0
+        self.sorted = False
+        # (name, error) of images that failed to decode, they are
+        # left to load on demand and fail there as they otherwise would
+        self.failed = []
+
+    def setNames(self, names):
+        # images already packed need nothing done
+        self.names = [name for name in sorted(set(names)) if name not in self.atlas.regions]
+        self.total = len(self.names)
+
+    def start(self):
+        if self.listNames is not None:
+            lister = threading.Thread(target=self._list, name="preloader list")
+            lister.daemon = True
+            lister.start()
+            self.workers.append(lister)
+        else:
+            self.startWorkers()
+
+    def startWorkers(self):
+        for name in self.names:
+            self.todo.put(name)
+        for i in xrange(min(self.maxWorkers, self.total)):
+            worker = threading.Thread(target=self._work, name="preloader%d" % i)
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+
+    def _list(self):
+        tracer.begin("list assets", "asset")
+        try:
+            self.setNames(self.listNames())
+        except Exception:
+            self.listError = sys.exc_info()
+        finally:
+            tracer.end("list assets", "asset")
+        if self.listError is None:
+            self.startWorkers()
+        self.listing = False
+
+    def _work(self):
+        while True:
+            try:
+                name = self.todo.get_nowait()
+            except Queue.Empty:
+                return
+            tracer.begin("decode", "asset", {'image': name})
+            try:
+                img = pyglet.image.load(name, file=self.loader.file(name))
+                self.results.put((name, img, None))
+            except Exception as err:
+                self.results.put((name, None, err))
+            tracer.end("decode", "asset")
+
+    def progress(self):
+        ''' fraction done, decoding and uploading counted as half each '''
+        if self.listing:
+            return 0.
+        if self.total == 0:
+            return 1.
+        return (self.received + self.uploaded + len(self.failed) * 2) / (self.total * 2.)
+
+    def isDone(self):
+        return not self.listing and self.uploaded + len(self.failed) == self.total
+
+    def step(self, budget=UPLOAD_BUDGET):
+        '''
+            takes what the workers have decoded and, once everything
+            is, packs images until budget seconds have passed.
+            returns whether every image is done.
+        '''
+        start = clock()
+        if self.listing:
+            return False
+        if self.listError is not None:
+            error, self.listError = self.listError, None
+            raise error[0], error[1], error[2]
+        while self.received + len(self.failed) < self.total:
+            try:
+                name, img, err = self.results.get_nowait()
+            except Queue.Empty:
+                return False
+            if err is not None:
+                self.failed.append((name, err))
+            else:
+                self.decoded.append((name, img))
+                self.received += 1
+        # packing waits for the whole set so it goes in tallest first
+        if self.sorted == False:
+            self.decoded = sortForPacking(self.decoded)
+            self.decoded.reverse()
+            self.sorted = True
+        while self.decoded:
+            name, img = self.decoded.pop()
+            if name not in self.atlas.regions:
+                self.atlas.add(name, img)
+            self.uploaded += 1
+            if clock() - start >= budget:
+                break
+        return self.isDone()
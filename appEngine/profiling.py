@@ -0,0 +1,136 @@
+'''
+Run profiling.
+
+Profiles a whole run of the game or editor loop with cProfile, or
+only its slowest frames, and writes the result both as a pstats file
+and as collapsed stacks for flame graph tools. A frame is one pass
+of pyglet's event loop idle, which runs the scheduled updates and
+draws the windows.
+'''
+import time
+import heapq
+import pstats
+import cProfile
+from timeit import default_timer as clock
+import pyglet
+
+
+def collapsedStacks(stats):
+    '''
+        returns lines of "caller;...;function microseconds" from
+        pstats.Stats. cProfile only records caller and callee pairs,
+        so each call path is given the share of a function's time
+        that its caller's calls account for, as flame graph
+        converters for cProfile usually do.
+    '''
+    entries = stats.stats
+    callees = dict()
+    for func, (cc, nc, tt, ct, callers) in entries.iteritems():
+        for caller, edge in callers.iteritems():
+            callees.setdefault(caller, []).append((func, edge[3]))
+    lines = dict()
+
+    def label(func):
+        filename, line, name = func
+        return "%s:%d:%s" % (filename, line, name)
+
+    def walk(func, path, share, stack):
+        cc, nc, tt, ct, callers = entries[func]
+        path = path + (label(func),)
+        if tt * share > 0:
+            key = ";".join(path)
+            lines[key] = lines.get(key, 0.) + tt * share
+        if ct <= 0:
+            return
+        for callee, edgeTime in callees.get(func, ()):
+            # recursion shows once, its time is in the outer call
+            if callee in stack:
+                continue
+            stack.add(callee)
+            total = entries[callee][3]
+            walk(callee, path, share * edgeTime / total if total > 0 else 0., stack)
+            stack.discard(callee)
+
+    for func, (cc, nc, tt, ct, callers) in entries.iteritems():
+        if not callers:
+            walk(func, (), 1., set([func]))
+    return ["%s %d" % (key, round(seconds * 1e6)) for key, seconds in
+        sorted(lines.iteritems()) if round(seconds * 1e6) > 0]
+
+
+'''
+    class RunProfiler
+    runs a function under the profiler, keeping only the slowest
+    frames when slowest is set, and writes PREFIX-TIME.pstats and
+    PREFIX-TIME.collapsed once it returns.
+'''
+class RunProfiler(object):
+    def __init__(self, prefix, slowest=0):
+        self.prefix = prefix
+        self.slowest = slowest
+        # (seconds, frame number, profile) of the slowest frames
+        self.frames = []
+        self.frameCount = 0
+
+    def run(self, function):
+        if self.slowest > 0:
+            loop = pyglet.app.EventLoop
+            # may be inherited, only the loop class's own is put back
+            ownIdle = loop.__dict__.get('idle')
+            idle = loop.idle
+            profiler = self
+
+            def profiledIdle(self):
+                return profiler.profileFrame(idle, self)
+            loop.idle = profiledIdle
+            try:
+                result = function()
+            finally:
+                if ownIdle is None:
+                    del loop.idle
+                else:
+                    loop.idle = ownIdle
+            frames = sorted(self.frames, reverse=True)
+            if not frames:
+                print "no frames profiled"
+                return result
+            stats = pstats.Stats(frames[0][2])
+            for seconds, number, profile in frames[1:]:
+                stats.add(profile)
+            print "slowest %d of %d frames: %s" % (len(frames), self.frameCount,
+                ", ".join("%d %.1fms" % (number, seconds * 1000)
+                    for seconds, number, profile in frames))
+        else:
+            profile = cProfile.Profile()
+            try:
+                result = profile.runcall(function)
+            finally:
+                profile.create_stats()
+            stats = pstats.Stats(profile)
+        self.write(stats)
+        return result
+
+    def profileFrame(self, idle, loop):
+        profile = cProfile.Profile()
+        start = clock()
+        profile.enable()
+        try:
+            return idle(loop)
+        finally:
+            profile.disable()
+            seconds = clock() - start
+            self.frameCount += 1
+            entry = (seconds, self.frameCount, profile)
+            if len(self.frames) < self.slowest:
+                heapq.heappush(self.frames, entry)
+            elif seconds > self.frames[0][0]:
+                heapq.heapreplace(self.frames, entry)
+
+    def write(self, stats):
+        base = self.prefix + time.strftime("-%Y%m%d-%H%M%S")
+        stats.dump_stats(base + ".pstats")
+        with open(base + ".collapsed", 'w') as f:
+            for line in collapsedStacks(stats):
+                f.write(line + "\n")
+        print "profile written to %s.pstats and %s.collapsed" % (base, base)
+        stats.sort_stats('cumulative').print_stats(20)
@@ -0,0 +1,64 @@
+'''
+Entity class registry.
+
+Maps the names object layer items use to the classes that play
+them, as listed in entities/modpaths. The file is read the first
+time a name is looked up, and a class's module is imported the
+first time a level uses it, then both are kept until the resource
+path changes.
+'''
+
+MODPATHS = "entities/modpaths"
+
+
+class UnknownEntity(Exception): """no class is listed for the entity name"""
+
+
+def parseModpaths(file):
+    ''' returns dict of entity name -> dotted class path from modpaths lines '''
+    paths = dict()
+    for line in file:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        name, sep, classPath = line.partition(" = ")
+        paths[name.strip()] = classPath.strip()
+    return paths
+
+
+def importClass(classPath):
+    moduleName, sep, className = classPath.rpartition(".")
+    module = __import__(moduleName, globals(), locals(), [className])
+    return getattr(module, className)
+
+
+'''
+    class EntityRegistry
+    resolves entity names to classes for a resource loader, caching
+    the parsed modpaths and every class it has imported.
+'''
+class EntityRegistry(object):
+    def __init__(self, loader):
+        self.loader = loader
+        self.paths = None
+        self.classes = dict()
+
+    def getPaths(self):
+        if self.paths is None:
+            self.paths = parseModpaths(self.loader.file(MODPATHS))
+        return self.paths
+
+    def getClass(self, name):
+        try:
+            return self.classes[name]
+        except KeyError:
+            paths = self.getPaths()
+            if name not in paths:
+                raise UnknownEntity("no class listed for entity %r" % name)
+            klass = self.classes[name] = importClass(paths[name])
+            return klass
+
+    def clear(self):
+        ''' forgets modpaths and resolved classes, imported modules stay loaded '''
+        self.paths = None
+        self.classes = dict()
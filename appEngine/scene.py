@@ -2,6 +2,7 @@
 Scene Management
 '''
 import math
+from timeit import default_timer as clock
 import pyglet
 from pyglet import window
 from pyglet.gl import *
@@ -11,10 +12,167 @@ from appEngine import rLoader
 from appEngine.director import Director
 import appEngine.scenegraph as scenegraph
 from appEngine.scenegraph import SceneGraph
-from appEngine import entity as entity
+from appEngine import streaming
+from appEngine import levelfile
+from appEngine.actor import TickRate
+from appEngine.spatial import SpatialHash
+from appEngine.particles import ParticlePool
+from appEngine.timing import timings
+from appEngine.trace import tracer
 
 
 class DuplicateActor(Exception): """actor is already in the world"""
+
+
+'''
+    class TierStats
+    work done for the actors of one tick rate in the last tick
+'''
+class TierStats(object):
+    def __init__(self):
+        self.actors = 0
+        self.updates = 0
+        self.time = 0.
+        self.deferred = 0
+        
+    def __repr__(self):
+        return "%d actors, %d updates, %.3fms, %d deferred" % (self.actors,
+            self.updates, self.time * 1000, self.deferred)
+
+
+'''
+    class Scheduler
+    updates actors at the tick rate they declare. throttled actors
+    are visited round robin, so a tier at 10Hz under a 60Hz scene
+    updates a sixth of its actors each tick instead of all of them
+    every sixth tick. with a budget set, throttled and event updates
+    stop once the tick has used it and carry over to the next.
+'''
+class Scheduler(object):
+    def __init__(self, budget=None):
+        # seconds a tick may spend on throttled and event updates
+        self.budget = budget
+        self.time = 0.
+        self.every = []
+        # tick rate -> actors, round robin position, updates owed
+        self.tiers = dict()
+        self.cursors = dict()
+        self.credit = dict()
+        self.events = []
+        # actor -> scheduler time it was last updated
+        self.lastTick = dict()
+        self.stats = dict()
+        
+    def add(self, actor):
+        rate = actor.tickRate
+        self.lastTick[actor] = self.time
+        if rate == TickRate.EVERY_FRAME:
+            self.every.append(actor)
+        elif rate == TickRate.ON_EVENT:
+            pass
+        else:
+            if rate not in self.tiers:
+                self.tiers[rate] = []
+                self.cursors[rate] = 0
+                self.credit[rate] = 0.
+            self.tiers[rate].append(actor)
+            
+    def remove(self, actor):
+        if actor not in self.lastTick:
+            return
+        del self.lastTick[actor]
+        rate = actor.tickRate
+        if rate == TickRate.EVERY_FRAME:
+            self.every.remove(actor)
+        elif rate != TickRate.ON_EVENT:
+            actors = self.tiers[rate]
+            i = actors.index(actor)
+            del actors[i]
+            if i < self.cursors[rate]:
+                self.cursors[rate] -= 1
+        if actor in self.events:
+            self.events.remove(actor)
+            
+    def wake(self, actor):
+        '''
+            queues an update of actor on the next tick, every frame
+            actors get one anyway
+        '''
+        if actor in self.lastTick and actor not in self.events and \
+            actor.tickRate != TickRate.EVERY_FRAME:
+            self.events.append(actor)
+            
+    def _update(self, actor):
+        now = self.time
+        actor.update(now - self.lastTick[actor])
+        # the update may have removed actor
+        if actor in self.lastTick:
+            self.lastTick[actor] = now
+        
+    def tick(self, dt):
+        self.time += dt
+        stats = self.stats = dict()
+        start = clock()
+        tier = stats[TickRate.EVERY_FRAME] = TierStats()
+        tier.actors = tier.updates = len(self.every)
+        for actor in list(self.every):
+            # removed by an update earlier in the tick
+            if actor in self.lastTick:
+                self._update(actor)
+        now = clock()
+        tier.time = now - start
+        if self.budget is None:
+            deadline = None
+        else:
+            deadline = start + self.budget
+        # woken actors first, they are waiting on something
+        tier = stats[TickRate.ON_EVENT] = TierStats()
+        events = self.events
+        tier.actors = len(events)
+        while events and (deadline is None or clock() < deadline):
+            self._update(events.pop(0))
+            tier.updates += 1
+        tier.deferred = len(events)
+        tier.time = clock() - now
+        for rate in sorted(self.tiers, reverse=True):
+            now = clock()
+            actors = self.tiers[rate]
+            tier = stats[rate] = TierStats()
+            tier.actors = len(actors)
+            if not actors:
+                self.credit[rate] = 0.
+                continue
+            # each actor is owed rate updates a second, no more than
+            # one each per tick however far behind the tier is
+            credit = min(self.credit[rate] + len(actors) * rate * dt, len(actors))
+            while credit >= 1:
+                if deadline is not None and clock() >= deadline:
+                    break
+                # updates may remove actors from the tier, remove
+                # keeps the stored cursor on the next actor
+                cursor = self.cursors[rate] % len(actors)
+                self.cursors[rate] = cursor + 1
+                self._update(actors[cursor])
+                credit -= 1
+                tier.updates += 1
+                if not actors:
+                    credit = 0.
+                    break
+            if actors:
+                self.cursors[rate] %= len(actors)
+            self.credit[rate] = credit
+            tier.deferred = int(credit)
+            tier.time = clock() - now
+            
+    def report(self):
+        ''' returns the last tick's stats as lines of text '''
+        names = {TickRate.EVERY_FRAME: "every frame", TickRate.ON_EVENT: "on event"}
+        lines = []
+        for rate in sorted(self.stats, key=lambda r: (r > 0, -r)):
+            lines.append("%-12s %r" % (names.get(rate, "%dHz" % rate), self.stats[rate]))
+        return "\n".join(lines)
+
+
 class Scene(window.key.KeyStateHandler, pyglet.event.EventDispatcher):
     def __init__(self, name, viewport):
         self.loaded = False
@@ -22,10 +180,18 @@ class Scene(window.key.KeyStateHandler, pyglet.event.EventDispatcher):
         self.batch = pyglet.graphics.Batch()
         self.foregroundGroup = pyglet.graphics.Group()
         self.actors = set()
+        self.scheduler = Scheduler()
         self.viewport = viewport
     
     def load(self):
         self.loaded = True
+        
+    def assets(self):
+        '''
+            resource image names to preload before the scene loads,
+            called on a preloader worker so it must not touch GL
+        '''
+        return []
 
         
     def unload(self, keepState=False):
@@ -43,6 +209,7 @@ class Scene(window.key.KeyStateHandler, pyglet.event.EventDispatcher):
         else:
             self.actors.add(actor)
             actor.addedToScene(self)
+            self.scheduler.add(actor)
 
 
     def hasActor(self, actor):
@@ -51,15 +218,18 @@ class Scene(window.key.KeyStateHandler, pyglet.event.EventDispatcher):
 
     def removeActor(self, actor):
         self.actors.remove(actor)
+        self.scheduler.remove(actor)
+        actor.removedFromScene(self)
 
 
     def clearActors(self):
+        for actor in self.actors:
+            self.scheduler.remove(actor)
         self.actors = set()
 
 
     def update(self, dt):
-        for actor in self.actors:
-            actor.update(dt)
+        self.scheduler.tick(dt)
             
     
 class OrientedCamera(object):
@@ -75,7 +245,7 @@ class OrientedCamera(object):
         viewportWidth = self.scene.viewport[0]
         viewportHeight = self.scene.viewport[1]
         
-        position = avatar.body.position
+        position = avatar.renderPosition
         '''horizontal'''
         if position[0] >= self.xThres and\
             position[0] <= (sceneWidth - viewportWidth) + self.xThres:
@@ -93,58 +263,239 @@ class ContinuousCamera(object):
         self.scene = scene
         self.incX = -incX
         self.incY = -incY
+        # focus kept unrounded here, the graph rounds it to whole
+        # pixels and would lose increments under one
+        self.focus = None
         
     def update(self):
-        self.scene.graph.moveFocus(x=self.incX, y=self.incY)
+        graph = self.scene.graph
+        if self.focus is None:
+            self.focus = (graph.focusX, graph.focusY)
+        self.focus = (self.focus[0] + self.incX, self.focus[1] + self.incY)
+        graph.setFocus(*self.focus)
             
 
 class LevelScene(Scene):
-    def __init__(self, name, filename, avatar, viewport, debugMode=False):
+    # simulation rate, independent of the frame rate
+    PHYSICS_STEP = 1./60
+    # physics steps run in one frame at most, time beyond that is
+    # dropped so a long hitch can't snowball into longer frames
+    MAX_SUBSTEPS = 5
+    # seconds a body must be idle before chipmunk puts it to sleep,
+    # sleeping actors are skipped when placing sprites
+    SLEEP_TIME = 0.5
+    # actors within this many screens of the view are active, and
+    # get suspended once they are twice as far out, as streamed
+    # chunks are loaded and evicted
+    ACTIVATION_SCREENS = streaming.LOAD_SCREENS
+    SUSPENDED_CELL_SIZE = 512
+    # with streaming, terrain this close to a body must be loaded
+    # for it to be simulated
+    TERRAIN_MARGIN = 64
+    
+    def __init__(self, name, filename, avatar, viewport, debugMode=False, streaming=False,
+        broadphase=None, updateBudget=None):
         super(LevelScene, self).__init__(name, viewport)
+        # seconds per step throttled actor updates may take, see Scheduler
+        self.scheduler.budget = updateBudget
         self.debugMode = debugMode
+        self.streaming = streaming
+        # appEngine.broadphase.Broadphase, chipmunk's tree when None
+        self.broadphase = broadphase
         self.filename = filename
+        # level data read ahead by assets, used by the next load
+        self.levelData = None
         self.space = pymunk.Space()
+        self.space.sleep_time_threshold = self.SLEEP_TIME
+        self.stepSize = self.PHYSICS_STEP
+        self.maxSubsteps = self.MAX_SUBSTEPS
+        # simulation time owed to the physics
+        self.accumulator = 0.
         self.graph = None
+        # group actor sprites join, set once the graph is loaded
+        self.actorGroup = None
+        # emitters of effect actors, made with the actor group
+        self.particles = None
+        # actors updated and simulated each step, the rest are
+        # suspended out of the space and indexed by position
+        self.active = set()
+        self.suspended = SpatialHash(self.SUSPENDED_CELL_SIZE)
+        self.hiddenBatch = pyglet.graphics.Batch()
+        self.activationRect = None
         self.avatar = avatar
-        self.avatar.setFocus(lambda:self.graph.focusX,lambda:self.graph.focusY)
-        self.addActor(self.avatar)
         self.camera = OrientedCamera(self, xThres=800, yThres=300)
         
     def load(self):
+        tracer.begin("LevelScene.load", "load", {'file': self.filename})
         try:
             super(LevelScene, self).load()
-            self.graph = SceneGraph.parseMapFile(self.filename, self.batch, rLoader,
-                self.viewport, space=self.space, debugMode=self.debugMode)
+            data = self.levelData
+            self.levelData = None
+            if data is None:
+                tracer.begin("levelfile.load", "load")
+                try:
+                    data = levelfile.load(self.filename)
+                finally:
+                    tracer.end("levelfile.load", "load")
+            self.graph = SceneGraph.fromLevelData(data, self.batch, rLoader,
+                self.viewport, space=self.space, debugMode=self.debugMode,
+                streaming=self.streaming, broadphase=self.broadphase)
             self.space.gravity = 0, -1000
+            self.actorGroup = self.graph.actorGroup
+            self.particles = ParticlePool(self.batch, self.actorGroup)
+            if not self.hasActor(self.avatar):
+                self.addActor(self.avatar)
             self.parseObjects()
+            self.activationRect = None
+            self.updateActivation(loading=True)
         except scenegraph.FileLoadFailedException as err:
             print "Level Parsing Failed: " + err.msg
         finally:
             self.loaded = False
+            tracer.end("LevelScene.load", "load")
+            
+    def assets(self):
+        tracer.begin("levelfile.load", "load", {'file': self.filename})
+        try:
+            self.levelData = levelfile.load(self.filename)
+        except scenegraph.FileLoadFailedException:
+            # load reports it
+            return []
+        finally:
+            tracer.end("levelfile.load", "load")
+        return SceneGraph.levelImages(self.levelData)
             
     def parseObjects(self):
         objects = self.graph.layers['object'].items
-        focusX = lambda : self.graph.focusX
-        focusY = lambda : self.graph.focusY
-        paths = entity.parseModpaths()
         for item in objects:
             if item.name == "levelstart":
                 self.avatar.setposition(item.x, item.y)
                 self.camera.update()
             else:
-                actorClass = entity.loadClass(paths, item.name)
-                actor = actorClass(focusX, focusY, self.batch)
+                actorClass = appEngine.entities.getClass(item.name)
+                actor = actorClass(self.batch)
                 actor.setposition(item.x,item.y)
                 self.addActor(actor)
         
+    def addActor(self, actor):
+        super(LevelScene, self).addActor(actor)
+        self.active.add(actor)
+        
+    def removeActor(self, actor):
+        super(LevelScene, self).removeActor(actor)
+        self.active.discard(actor)
+        self.suspended.remove(actor)
+        
+    def clearActors(self):
+        # active bodies leave the space, suspended ones are out already
+        for actor in self.active:
+            if hasattr(actor, 'suspend'):
+                actor.suspend(self.space)
+        super(LevelScene, self).clearActors()
+        self.active = set()
+        self.suspended.clear()
+        self.activationRect = None
+        
+    def suspendActor(self, actor):
+        self.active.remove(actor)
+        self.scheduler.remove(actor)
+        actor.suspend(self.space)
+        actor.batch = self.hiddenBatch
+        x, y = actor.body.position
+        self.suspended.insert(actor, (x, y, x, y))
+        
+    def resumeActor(self, actor):
+        self.suspended.remove(actor)
+        actor.resume(self.space)
+        actor.batch = self.batch
+        self.active.add(actor)
+        self.scheduler.add(actor)
+        
+    def terrainLoaded(self, actor):
+        ''' whether the streamed terrain around actor is in the space '''
+        streamer = self.graph.streamer
+        if streamer is None:
+            return True
+        x, y = actor.body.position
+        m = self.TERRAIN_MARGIN
+        return streamer.isLoaded(x - m, y - m, x + m, y + m)
+        
+    '''
+        suspends active actors that have left the area around the
+        view and resumes suspended ones the view has come near.
+        only the active actors and the suspended ones near the
+        view are looked at. with streaming, actors are also kept
+        suspended while the terrain under them isn't loaded. when
+        loading, every actor outside the resume rect is suspended.
+    '''
+    def updateActivation(self, loading=False):
+        x1, y1, x2, y2 = self.graph.getViewRect()
+        padX = self.viewport[0] * self.ACTIVATION_SCREENS
+        padY = self.viewport[1] * self.ACTIVATION_SCREENS
+        if loading == True:
+            sx1, sy1, sx2, sy2 = x1 - padX, y1 - padY, x2 + padX, y2 + padY
+        else:
+            sx1, sy1 = x1 - padX * 2, y1 - padY * 2
+            sx2, sy2 = x2 + padX * 2, y2 + padY * 2
+        for actor in list(self.active):
+            if getattr(actor, 'suspendable', False) == False:
+                continue
+            x, y = actor.body.position
+            if x < sx1 or x > sx2 or y < sy1 or y > sy2 or not self.terrainLoaded(actor):
+                self.suspendActor(actor)
+        rect = (x1 - padX, y1 - padY, x2 + padX, y2 + padY)
+        if rect != self.activationRect:
+            self.activationRect = rect
+            for actor in self.suspended.queryRect(*rect):
+                if self.terrainLoaded(actor):
+                    self.resumeActor(actor)
+        
     def unload(self, keepState=False):
         if self.graph is not None:
-            self.graph.delete(keepState)
+            self.graph.unload(keepState)
         super(LevelScene, self).unload(keepState)
+        if self.particles is not None:
+            self.particles.clear()
         
+    '''
+        runs the physics and actor logic in fixed steps for the time
+        passed, then draws actors between their last two physics
+        states by the fraction of a step left over.
+    '''
     def update(self, dt):
-        self.space.step(1./60)
+        tracer.begin("LevelScene.update", "frame")
+        self.accumulator += dt
+        steps = 0
+        while self.accumulator >= self.stepSize and steps < self.maxSubsteps:
+            for actor in self.active:
+                if hasattr(actor, 'savePhysicsState') and not actor.body.is_sleeping:
+                    actor.savePhysicsState()
+            tracer.begin("step", "frame")
+            timings.begin('physics')
+            self.space.step(self.stepSize)
+            timings.end('physics')
+            timings.begin('actors')
+            self.scheduler.tick(self.stepSize)
+            timings.end('actors')
+            tracer.end("step", "frame")
+            self.accumulator -= self.stepSize
+            steps += 1
+        if steps == self.maxSubsteps:
+            self.accumulator = min(self.accumulator, self.stepSize)
+        alpha = self.accumulator / self.stepSize
+        timings.begin('sprites')
+        for actor in self.active:
+            # sleeping bodies haven't moved, their sprites stay put
+            if hasattr(actor, 'interpolate') and not actor.body.is_sleeping:
+                actor.interpolate(alpha)
+                actor.updateSprite()
+        timings.end('sprites')
+        timings.begin('camera')
         if self.camera is not None:
             self.camera.update()
-        super(LevelScene, self).update(dt)
+        timings.end('camera')
+        timings.begin('activation')
+        self.updateActivation()
+        timings.end('activation')
+        tracer.end("LevelScene.update", "frame")
     
@@ -2,10 +2,19 @@
     Scene Graph implementation
 '''
 import os
-import xml.etree.ElementTree as ET
+import math
+from array import array
+from functools import partial
 from xml.etree.ElementTree import Element, SubElement, ElementTree
 import pymunk
-from appEngine import rLoader
+from appEngine import atlas
+from appEngine.spatial import SpatialHash, rotatedBounds, segmentDistanceSq, segmentIntersectsRect
+from appEngine.streaming import ChunkStreamer
+from appEngine import terrain
+from appEngine.broadphase import Broadphase
+from appEngine import levelfile
+from appEngine.levelfile import FileLoadFailedException
+from appEngine.trace import tracer
 import pyglet
 from pyglet.graphics import OrderedGroup
 from pyglet.gl import glColor3f, glColor4f, glLineWidth, glBegin, glVertex3i,\
@@ -16,8 +25,9 @@ from pyglet.gl import glColor3f, glColor4f, glLineWidth, glBegin, glVertex3i,\
     z position of layers.
 '''
 class DrawZPos(object):
-    TERRAIN_LINES = 7 #for debug\
-    FRONT = 6
+    TERRAIN_LINES = 8 #for debug\
+    FRONT = 7
+    ACTORS = 6
     SPRITES = 5
     FOREGROUND = 4
 
@@ -31,20 +41,46 @@ class BaseLayer(object):
         self.viewportWidth = sceneGraph.viewportWidth
         self.viewportHeight = sceneGraph.viewportHeight
     
+    def setViewRect(self, rect):
+        pass
+    
     def update(self, dt):
         pass
         
 class Rect(object):
-    def __init__(self, x, y, x2, y2):
+    def __init__(self, x, y, (imageWidth, imageHeight), scale=1.0, rot=0):
         self.x = x
         self.y = y
-        self.x2 = x2
-        self.y2 = y2
+        # size of the unscaled image, x2 and y2 follow from it
+        self.imageWidth = imageWidth
+        self.imageHeight = imageHeight
+        self.scale = scale
+        self.rot = rot
         self.sprite = None
+        self.layer = None # owning item layer
+        self.updateExtent()
+        
+    def updateExtent(self):
+        ''' the one place item extents come from, for every item type '''
+        self.x2 = self.x + int(self.imageWidth * self.scale)
+        self.y2 = self.y + int(self.imageHeight * self.scale)
+        
+    def getBounds(self):
+        ''' axis aligned bounds including rotation about x,y '''
+        return rotatedBounds(self.x, self.y, self.x2 - self.x, self.y2 - self.y, self.rot)
         
     def doesPointIntersect(self, point, threshold):
         x = point[0]
         y = point[1]
+        if self.rot:
+            # bring point into the unrotated frame of the rect
+            r = math.radians(self.rot)
+            cr = math.cos(r)
+            sr = math.sin(r)
+            dx = x - self.x
+            dy = y - self.y
+            x = self.x + dx * cr - dy * sr
+            y = self.y + dx * sr + dy * cr
         if x > self.x and x < self.x2 and \
             y > self.y and y < self.y2:
             return True
@@ -56,46 +92,140 @@ class Rect(object):
             self.x = x
         if y is not None:
             self.y = y
-        self.x2 = self.x + self.sprite.width
-        self.y2 = self.y + self.sprite.height
-        self.sprite.x = self.x
-        self.sprite.y = self.y
+        if self.sprite is not None:
+            self.sprite.x = self.x
+            self.sprite.y = self.y
+        self.changed()
+        
+    def setScale(self, scale):
+        self.scale = scale
+        if self.sprite is not None:
+            self.sprite.scale = scale
+        self.changed()
+        
+    def setRotation(self, rot):
+        self.rot = rot
+        if self.sprite is not None:
+            self.sprite.rotation = rot
+        self.changed()
+        
+    def changed(self):
+        ''' recomputes the extents and reindexes in the owning layer '''
+        self.updateExtent()
+        if self.layer is not None:
+            self.layer.itemMoved(self)
+        
+'''
+    ItemLayer
+    base of layers holding positioned items, keeps them in a
+    spatial index for picking.
+'''
+class ItemLayer(BaseLayer):
+    INDEX_CELL_SIZE = 256
+    viewRect = None
+    
+    def initItems(self):
+        self.items = []
+        self.index = SpatialHash(self.INDEX_CELL_SIZE)
+        # items whose sprites are currently in the drawn batch
+        self.shown = set()
+        # culled sprites are parked in a batch that is never drawn
+        self.hiddenBatch = pyglet.graphics.Batch()
+    
+    def storeItem(self, item):
+        self.items.append(item)
+        item.layer = self
+        self.index.insert(item, item.getBounds())
+        self.cullItem(item)
+        
+    def removeItem(self, item):
+        self.items.remove(item)
+        self.index.remove(item)
+        self.shown.discard(item)
+        item.layer = None
+        if item.sprite is not None:
+            item.sprite.delete()
+            item.sprite = None
+            
+    def itemMoved(self, item):
+        self.index.update(item, item.getBounds())
+        self.cullItem(item)
+            
+    def unload(self):
+        for item in self.items:
+            if item.sprite is not None:
+                item.sprite.delete()
+        self.index.clear()
+        self.shown = set()
+        
+    '''
+        keeps only the sprites of items overlapping rect in the
+        layer batch, the rest are moved to the hidden batch.
+    '''
+    def setViewRect(self, rect):
+        self.viewRect = rect
+        inView = self.index.queryRect(*rect)
+        for item in self.shown - inView:
+            self.hideItem(item)
+        for item in inView - self.shown:
+            self.showItem(item)
+        self.shown = inView
+        
+    def cullItem(self, item):
+        if self.viewRect is None:
+            self.showItem(item)
+            self.shown.add(item)
+            return
+        x1, y1, x2, y2 = self.viewRect
+        ix1, iy1, ix2, iy2 = self.index.getBounds(item)
+        if ix1 <= x2 and ix2 >= x1 and iy1 <= y2 and iy2 >= y1:
+            self.showItem(item)
+            self.shown.add(item)
+        else:
+            self.hideItem(item)
+            self.shown.discard(item)
+            
+    def showItem(self, item):
+        if item.sprite is not None:
+            item.sprite.batch = self.batch
+    
+    def hideItem(self, item):
+        if item.sprite is not None:
+            item.sprite.batch = self.hiddenBatch
+        
+    '''
+        returns the item under point, or None
+    '''
+    def isPointOverItem(self, point, threshold):
+        for item in self.index.queryPoint(point[0], point[1]):
+            if item.doesPointIntersect(point, threshold) == True:
+                return item
+        return None
+        
+    def itemsInRect(self, x1, y1, x2, y2):
+        return self.index.queryRect(x1, y1, x2, y2)
         
 '''  
     Aesthetic Layer 
 '''
 class AestheticGroup(OrderedGroup):
-    def __init__(self, z_order):
-        super(AestheticGroup, self).__init__(z_order)
-        self.focusX = 0
-        self.focusY = 0
+    def __init__(self, z_order, parent=None):
+        super(AestheticGroup, self).__init__(z_order, parent)
         self.visible = True
-        
-    def setFocus(self, x, y):
-        self.focusX = x
-        self.focusY = y
 
     def set_state(self):
-        glTranslatef(self.focusX, self.focusY, 0)
         if self.visible == False:
             glColorMask(GL_FALSE,GL_FALSE,GL_FALSE,GL_FALSE)
         
     def unset_state(self):
-        glTranslatef(-self.focusX, -self.focusY, 0)
         if self.visible == False:
             glColorMask(GL_TRUE,GL_TRUE,GL_TRUE,GL_TRUE)
         
 class Visual(Rect):
-    def __init__(self, name, (x,y), scale, rot, layerOpacity, sprite):
-        x = x
-        y = y
-        x2 = x + sprite.width
-        y2 = y + sprite.height
-        super(Visual, self).__init__(x,y,x2,y2)
+    def __init__(self, name, (x,y), imageSize, scale, rot, layerOpacity, sprite):
+        super(Visual, self).__init__(x, y, imageSize, scale, rot)
         self.name = name
         self.sprite = sprite
-        self.scale = scale
-        self.rot = rot
         self.absOpacity = 255
         self.opacity = self.absOpacity * layerOpacity
         
@@ -104,23 +234,20 @@ class Visual(Rect):
         self.opacity = layerOpacity * self.absOpacity
         self.sprite.opacity = self.opacity
         
-class AestheticLayer(BaseLayer):
+class AestheticLayer(ItemLayer):
     dir = 'visuals'
-    def __init__(self, name, batch, rLoader, z_order, editorMode=False):
+    def __init__(self, name, batch, rLoader, z_order, editorMode=False, parent=None):
         self.batch = batch
         self.rLoader = rLoader
         self.name = name
-        self.group = AestheticGroup(z_order)
+        self.parentGroup = parent
+        self.group = AestheticGroup(z_order, parent)
         self.z_order = z_order
-        self.items = []
+        self.initItems()
         self.editorMode = editorMode
         self.visible = True
         self.opacity = 1.0
         
-    def unload(self):
-        for item in self.items:
-            item.sprite.delete()
-            
     def reload(self):
         pass
         
@@ -130,7 +257,7 @@ class AestheticLayer(BaseLayer):
         
     def setZOrder(self, value):
         self.z_order = value
-        self.group = AestheticGroup(value)
+        self.group = AestheticGroup(value, self.parentGroup)
         for item in self.items:
             item.sprite.group = self.group
         
@@ -141,93 +268,59 @@ class AestheticLayer(BaseLayer):
         
     def addItem(self, item, (x,y), scale, rot):
         file = item + ".png"
-        img = rLoader.image(self.dir + "/" + file)
+        img = atlas.image(self.dir + "/" + file)
         sprite = pyglet.sprite.Sprite(img, batch=self.batch, group=self.group)
         sprite.x = x
         sprite.y = y
         sprite.scale = scale
         sprite.rotation = rot
-        self.items.append(Visual(item, (x,y), scale, rot, self.opacity, sprite))
-        
-        
-    '''
-        doesPointIntersect()
-        returns boolean based on whether point is over line
-        given threshold of width
-    '''
-    def isPointOverItem(self, point, threshold):
-        for item in self.items:
-            if item.doesPointIntersect(point, threshold) == True:
-                return item
-        return None
+        visual = Visual(item, (x,y), (img.width, img.height), scale, rot, self.opacity, sprite)
+        self.storeItem(visual)
+        return visual
 
 
 '''
     Object Layer
 '''
 class ObjectGroup(OrderedGroup):
-    def __init__(self):
-        super(ObjectGroup, self).__init__(DrawZPos.SPRITES)
-        self.focusX = 0
-        self.focusY = 0
-        
-    def setFocus(self, x, y):
-        self.focusX = x
-        self.focusY = y
-
-    def set_state(self):
-        glTranslatef(self.focusX, self.focusY, 0)
-        
-    def unset_state(self):
-        glTranslatef(-self.focusX, -self.focusY, 0)
+    def __init__(self, parent=None):
+        super(ObjectGroup, self).__init__(DrawZPos.SPRITES, parent)
         
 class Object(Rect):
-    def __init__(self, name, (x,y), (x2,y2), scale, rot, opacity, sprite):
-        super(Object, self).__init__(x,y,x2,y2)
+    def __init__(self, name, (x,y), imageSize, scale, rot, opacity, sprite):
+        super(Object, self).__init__(x, y, imageSize, scale, rot)
         self.name = name
         self.sprite = sprite
-        self.scale = scale
-        self.rot = rot
         
         
-class ObjectLayer(BaseLayer):
+class ObjectLayer(ItemLayer):
     dir = 'entities'
     name = 'entities'
     
-    def __init__(self, batch, rLoader, editorMode=False):
+    def __init__(self, batch, rLoader, editorMode=False, parent=None):
         self.batch = batch
         self.editorMode = editorMode
-        self.items = []
-        self.group = ObjectGroup()
+        self.initItems()
+        self.group = ObjectGroup(parent)
         
-    def unload(self):
-        for item in self.items:
-            item.sprite.delete()
-            
     def reload(self):
         pass
         
     def addItem(self, item, (x,y), scale, rot):
         file = item + ".png"
-        img = rLoader.image(self.dir + "/" + file)
+        img = atlas.image(self.dir + "/" + file)
         sprite = pyglet.sprite.Sprite(img, batch=self.batch, group=self.group)
         sprite.x = x
         sprite.y = y
-        x2 = x + sprite.width
-        y2 = y + sprite.height
         if self.editorMode is True:
             sprite.scale = scale
             sprite.rotation = rot
         else:
             sprite.delete()
             sprite = None
-        self.items.append(Object(item, (x,y), (x2,y2), scale, rot, 1.0, sprite))
-        
-    def isPointOverItem(self, point, threshold):
-        for item in self.items:
-            if item.doesPointIntersect(point, threshold) == True:
-                return item
-        return None
+        obj = Object(item, (x,y), (img.width, img.height), scale, rot, 1.0, sprite)
+        self.storeItem(obj)
+        return obj
         
 
 ''' 
@@ -235,15 +328,17 @@ class ObjectLayer(BaseLayer):
     manages the terrain line of sim
 '''
 ''' Class Line
-    stores a current terrain layer line and its vertex list 
+    stores a current terrain layer line and its slot in the
+    layer's shared vertex list
 '''
 class Line(object):
-    def __init__(self, x1, y1, x2, y2, vl=None):
+    def __init__(self, x1, y1, x2, y2):
         self.x1 = x1
         self.y1 = y1
         self.x2 = x2
         self.y2 = y2
-        self.vl = vl # gl vertex list
+        self.layer = None
+        self.index = None # slot in layer vertex list
         
     
     def updatePos(self, x1, y1, x2, y2):
@@ -251,9 +346,12 @@ class Line(object):
         self.y1 = y1
         self.x2 = x2
         self.y2 = y2
-        if self.vl is not None:
-            #TODO check that this is right.
-            sef.vl.vertices = [x1, y1, x2, y2]
+        if self.layer is not None:
+            self.layer.lineMoved(self)
+            
+    def updatePosition(self, x1=None, y1=None, x2=None, y2=None):
+        self.updatePos(self.x1 if x1 is None else x1, self.y1 if y1 is None else y1,
+            self.x2 if x2 is None else x2, self.y2 if y2 is None else y2)
     
     '''
         function doesPointIntersect()
@@ -261,38 +359,52 @@ class Line(object):
         given threshold of width
     '''
     def doesPointIntersect(self, point, threshold):
-        #TODO
-        pass
+        return segmentDistanceSq(point[0], point[1], self.x1, self.y1,
+            self.x2, self.y2) <= threshold * threshold
         
-class TerrainGroup(OrderedGroup):
-    def __init__(self):
-        super(TerrainGroup, self).__init__(DrawZPos.TERRAIN_LINES)
-        self.focusX = 0
-        self.focusY = 0
+    def getBounds(self):
+        return (min(self.x1, self.x2), min(self.y1, self.y2),
+            max(self.x1, self.x2), max(self.y1, self.y2))
         
-    def setFocus(self, x, y):
-        self.focusX = x
-        self.focusY = y
+class TerrainGroup(OrderedGroup):
+    def __init__(self, parent=None):
+        super(TerrainGroup, self).__init__(DrawZPos.TERRAIN_LINES, parent)
 
     def set_state(self):
         glLineWidth(2)
-        glTranslatef(self.focusX, self.focusY, 0)
-        
-    def unset_state(self):
-        glTranslatef(-self.focusX, -self.focusY, 0)
         
 class TerrainLayer(BaseLayer):
     name = 'terrain'
-    def __init__(self, batch=None, dl=False):
+    # line slots the shared vertex list starts with, doubled as it fills
+    LINE_CAPACITY = 64
+    INDEX_CELL_SIZE = 256
+    
+    def __init__(self, batch=None, dl=False, parent=None):
         self.drawLines = dl
         self.batch = batch
         self.initColors()
         self.lines = []
-        self.group = TerrainGroup()
+        # packed x1, y1, x2, y2 of each line slot, read by the
+        # queries below and copied into the vertex list
+        self.coords = array('f')
+        self.index = SpatialHash(self.INDEX_CELL_SIZE)
+        self.group = TerrainGroup(parent)
+        # one GL_LINES list holds every line, two vertices per slot.
+        # slots past the last line are zero length and draw nothing.
+        self.vl = None
+        self.capacity = 0
         
     def unload(self):
+        if self.vl is not None:
+            self.vl.delete()
+            self.vl = None
+            self.capacity = 0
         for line in self.lines:
-            line.vl.delete()
+            line.layer = None
+            line.index = None
+        self.lines = []
+        self.coords = array('f')
+        self.index.clear()
             
     def reload(self):
         pass
@@ -313,32 +425,158 @@ class TerrainLayer(BaseLayer):
         try:
             color = self.colors[color]
             self.curColor = color
-            for line in self.lines:
-                line.vl.colors = [color[0],color[1],color[2],color[0],color[1],color[2]]
+            if self.vl is not None:
+                self.vl.colors[:] = tuple(color) * (self.capacity * 2)
         except KeyError:
             print "Line Colour Key Error"
     
+    '''
+        grows the vertex list to hold count lines, writing the
+        new slots as empty lines
+    '''
+    def reserve(self, count):
+        if self.drawLines == False or count <= self.capacity:
+            return
+        capacity = max(self.capacity, self.LINE_CAPACITY)
+        while capacity < count:
+            capacity *= 2
+        if self.vl is None:
+            self.vl = self.batch.add(capacity * 2, pyglet.gl.GL_LINES, self.group,
+                'v2f/dynamic', 'c3f/dynamic')
+        else:
+            self.vl.resize(capacity * 2)
+        # resized storage holds whatever was in the buffer before
+        self.vl.vertices[self.capacity * 4:] = (0.,) * ((capacity - self.capacity) * 4)
+        self.vl.colors[self.capacity * 6:] = tuple(self.curColor) * ((capacity - self.capacity) * 2)
+        self.capacity = capacity
+        
+    def writeLines(self, start, end):
+        ''' copies the coordinates of slots start to end into the vertex list '''
+        if self.vl is None or start >= end:
+            return
+        self.vl.vertices[start * 4:end * 4] = self.coords[start * 4:end * 4]
+    
     '''
         adds a line to the terrain layer upon preview being false,
         while preview is true, line is not stored permanetely and
         just temporarly added to batch
     '''
     def addLine(self, x1, y1, x2, y2):
-        vl = None
-        if self.drawLines:
-            vl = self.batch.add(2, pyglet.gl.GL_LINES, self.group,
-                ('v2f', (x1, y1, x2, y2)),
-                ('c3f', (self.curColor[0],self.curColor[1],self.curColor[2])*2))
-        self.lines.append(Line(x1, y1, x2, y2, vl))
+        return self.addLines(((x1, y1, x2, y2),))[0]
+        
+    '''
+        adds lines from a sequence of (x1, y1, x2, y2) with
+        one resize and one vertex write, returns the new lines
+    '''
+    def addLines(self, coords):
+        start = len(self.lines)
+        added = []
+        packed = self.coords
+        index = self.index
+        for x1, y1, x2, y2 in coords:
+            line = Line(x1, y1, x2, y2)
+            line.layer = self
+            line.index = start + len(added)
+            packed.extend((x1, y1, x2, y2))
+            index.insert(line, line.getBounds())
+            added.append(line)
+        self.lines.extend(added)
+        self.reserve(len(self.lines))
+        self.writeLines(start, len(self.lines))
+        return added
+        
+    '''
+        removes line by moving the last line into its slot
+    '''
+    def removeLine(self, line):
+        index = line.index
+        last = self.lines.pop()
+        coords = self.coords
+        if last is not line:
+            self.lines[index] = last
+            last.index = index
+            coords[index * 4:index * 4 + 4] = coords[-4:]
+            self.writeLines(index, index + 1)
+        del coords[-4:]
+        self.index.remove(line)
+        if self.vl is not None:
+            end = len(self.lines)
+            self.vl.vertices[end * 4:end * 4 + 4] = (0.,) * 4
+        line.layer = None
+        line.index = None
+        
+    def lineMoved(self, line):
+        i = line.index * 4
+        self.coords[i:i + 4] = array('f', (line.x1, line.y1, line.x2, line.y2))
+        self.index.update(line, line.getBounds())
+        self.writeLines(line.index, line.index + 1)
+        
+    '''
+        returns the nearest result of measure over lines near x,y,
+        searching out to maxDist or, without one, widening the
+        search until something is found.
+        measure(coords offset, x, y) gives (squared distance, result)
+    '''
+    def _nearest(self, x, y, maxDist, measure):
+        if len(self.lines) == 0:
+            return None
+        radius = maxDist if maxDist is not None else self.index.cellSize
+        while True:
+            best = None
+            bestDist = radius * radius
+            for line in self.index.queryRect(x - radius, y - radius, x + radius, y + radius):
+                dist, result = measure(line.index * 4, x, y)
+                if dist <= bestDist:
+                    best = result
+                    bestDist = dist
+            # anything within radius has bounds in the searched square,
+            # so a hit here is the nearest overall
+            if best is not None or maxDist is not None:
+                return best
+            radius *= 2
+            
+    def _endpointDistance(self, i, x, y):
+        c = self.coords
+        d1 = (c[i] - x) * (c[i] - x) + (c[i + 1] - y) * (c[i + 1] - y)
+        d2 = (c[i + 2] - x) * (c[i + 2] - x) + (c[i + 3] - y) * (c[i + 3] - y)
+        if d1 <= d2:
+            return d1, (c[i], c[i + 1])
+        return d2, (c[i + 2], c[i + 3])
+        
+    def _segmentDistance(self, i, x, y):
+        c = self.coords
+        return (segmentDistanceSq(x, y, c[i], c[i + 1], c[i + 2], c[i + 3]),
+            self.lines[i // 4])
+        
+    '''
+        returns (x, y) of the line end nearest point, or None
+    '''
+    def nearestEndpoint(self, point, maxDist=None):
+        return self._nearest(point[0], point[1], maxDist, self._endpointDistance)
+        
+    '''
+        returns the line nearest point, or None
+    '''
+    def nearestSegment(self, point, maxDist=None):
+        return self._nearest(point[0], point[1], maxDist, self._segmentDistance)
+        
+    '''
+        returns set of lines passing through given rectangle
+    '''
+    def segmentsInRect(self, x1, y1, x2, y2):
+        c = self.coords
+        found = set()
+        for line in self.index.queryRect(x1, y1, x2, y2):
+            i = line.index * 4
+            if segmentIntersectsRect(c[i], c[i + 1], c[i + 2], c[i + 3], x1, y1, x2, y2):
+                found.add(line)
+        return found
     
     '''
         returns the line that click is over
     '''
     def isPointOverItem(self, point, threshold):
-        for line in self.lines:
-            if line.doesPointIntersect(point, threshold) == True:
-                return line
-        return None
+        return self.nearestSegment(point, threshold)
             
 '''
     Layers
@@ -364,61 +602,101 @@ class Layers(list):
         return self.by_name[item]
         
 class BackgroundGroup(OrderedGroup):
-    def __init__(self, z_order):
+    def __init__(self, z_order, parent=None):
+        self.visible = True
+        super(BackgroundGroup, self).__init__(z_order, parent)
+
+    def set_state(self):
+        if self.visible == False:
+            glColorMask(GL_FALSE,GL_FALSE,GL_FALSE,GL_FALSE)
+        
+    def unset_state(self):
+        if self.visible == False:
+            glColorMask(GL_TRUE,GL_TRUE,GL_TRUE,GL_TRUE)
+
+'''
+    CameraGroup
+    parent of every layer group, applies the view translation
+    once for all of them.
+'''
+class CameraGroup(OrderedGroup):
+    def __init__(self, order=0, parent=None):
+        super(CameraGroup, self).__init__(order, parent)
         self.focusX = 0
         self.focusY = 0
-        self.visible = True
-        super(BackgroundGroup, self).__init__(z_order)
+        
+    # ordered groups of equal order compare equal, and the batch
+    # would merge the cameras of two graphs sharing it
+    def __eq__(self, other):
+        return self is other
+        
+    def __hash__(self):
+        return id(self)
         
     def setFocus(self, x, y):
         self.focusX = x
         self.focusY = y
 
     def set_state(self):
+        glPushMatrix()
         glTranslatef(self.focusX, self.focusY, 0)
-        if self.visible == False:
-            glColorMask(GL_FALSE,GL_FALSE,GL_FALSE,GL_FALSE)
         
     def unset_state(self):
-        glTranslatef(-self.focusX, -self.focusY, 0)
-        if self.visible == False:
-            glColorMask(GL_TRUE,GL_TRUE,GL_TRUE,GL_TRUE)
+        glPopMatrix()
 
 '''
     sceneGraph
     
 '''
-class FileLoadFailedException(Exception): 
-    """failed to load level file"""
-    def __init__(self, msg):
-        self.msg = msg
 class SceneGraph(object):
     FILE_EXT = ".lvl"
+    SEGMENT_RADIUS = 5
+    # distance beyond viewport edges in which items stay in batch
+    CULL_MARGIN = 128
     def __init__(self, name, batch, resourceLoader, viewportSize, width=0, height=0, space=None, 
-        editorMode=False, debugMode=False):
+        editorMode=False, debugMode=False, cullMargin=CULL_MARGIN, broadphase=None):
         self.batch = batch
         self.space = space
+        # broadphase given to space when physics is generated
+        if broadphase is None:
+            broadphase = Broadphase()
+        self.broadphase = broadphase
         #
         self.width = width
         self.height = height
         self.focusX, self.focusY = 0, 0
         self.viewportWidth, self.viewportHeight = viewportSize
+        self.viewScale = 1.0
+        self.cullMargin = cullMargin
         self.backColour = [0.,0.,0.]
         self.name = name
         self.editorMode = editorMode
+        self.debugMode = debugMode
         self.rLoader = resourceLoader
         self.forceFocus = editorMode
+        self.streamer = None
+        # lines dropped by the last terrain simplification
+        self.terrainRemoved = 0
+        # view transform shared by every layer
+        self.camera = CameraGroup()
         # layers:
         self.layers = Layers()
-        self.layers.addNamed(AestheticLayer("foreground", self.batch, self.rLoader, DrawZPos.FOREGROUND, editorMode=editorMode), "foreground")
-        self.layers.addNamed(ObjectLayer(self.batch, self.rLoader, editorMode=editorMode), "object")
-        self.layers.addNamed(TerrainLayer(self.batch, dl=editorMode or debugMode), "terrain")
+        self.layers.addNamed(AestheticLayer("foreground", self.batch, self.rLoader, DrawZPos.FOREGROUND,
+            editorMode=editorMode, parent=self.camera), "foreground")
+        self.layers.addNamed(ObjectLayer(self.batch, self.rLoader, editorMode=editorMode,
+            parent=self.camera), "object")
+        self.layers.addNamed(TerrainLayer(self.batch, dl=editorMode or debugMode,
+            parent=self.camera), "terrain")
         self.background = None
-        self.backgroundGroup = BackgroundGroup(1)
+        self.backgroundGroup = BackgroundGroup(1, self.camera)
+        # actor sprites are drawn in world coordinates under the camera
+        self.actorGroup = OrderedGroup(DrawZPos.ACTORS, self.camera)
         self.updateBackground()
         
     def unload(self, keepState):
         self.background.delete()
+        if self.streamer is not None:
+            self.streamer.unload()
         names = []
         for layer in self.layers:
             names.append(layer.name)
@@ -432,99 +710,144 @@ class SceneGraph(object):
             layer.reload()
         
     def addAestheticLayer(self, name, z_order):
-        self.layers.addNamed(AestheticLayer(name, self.batch, self.rLoader, z_order, editorMode=self.editorMode), name)
+        layer = AestheticLayer(name, self.batch, self.rLoader, z_order, editorMode=self.editorMode,
+            parent=self.camera)
+        self.layers.addNamed(layer, name)
+        layer.setViewRect(self.getViewRect())
         
     def deleteAestheticLayer(self, name):
         self.layers[name].delete()
         self.layers.delete(name)
     '''
-    returns a scenegraph constructed from specified file
+    returns a scenegraph constructed from specified file.
+    with streaming, terrain and aesthetic items are only recorded
+    and get loaded chunk by chunk as the focus moves.
     '''
     @classmethod
     def parseMapFile(cls, fileName, batch, resourceLoader, 
-        viewportSize, space=None, editorMode=False, debugMode=False):
-        def invalidFile():
-            print "invalid file"
-        try:  
-            tree = ET.parse(fileName)
-            root = tree.getroot()
-            if root.tag != 'map':
-                invalidFile()
-                return
-            width = int(root.attrib['width'])
-            height = int(root.attrib['height'])
-            if root[0].tag != 'head':
-                invalidFile()
-                return
-            head = root[0]
-            for child in head:
-                if child.tag == 'name':
-                    mapName = child.text
-                #elif child.tag == 'source':
-                #    source = child.text
-                
-            graph = cls(mapName, batch, resourceLoader, viewportSize, width, height, space=space, 
-                editorMode=editorMode, debugMode=debugMode)
-                
-            if root[1].tag != 'layers':
-                invalidFile()
-                graph = None
-                return
-            layers = root[1]
-            for child in layers:
-                if child.tag == 'terrainlayer':
-                    layer = graph.layers['terrain']
-                    for line in child:
-                        x1 = int(line.get('x1'))
-                        y1 = int(line.get('y1'))
-                        x2 = int(line.get('x2'))
-                        y2 = int(line.get('y2'))
-                        layer.addLine(x1,y1,x2,y2)
-                elif child.tag == 'objectlayer':
-                    layer = graph.layers['object']
-                    for item in child:
-                        name = item.get('name')
-                        x = int(item.get('x'))
-                        y = int(item.get('y'))
-                        rot = 0.0
-                        scale = 1.0
-                        layer.addItem(name, (x,y), scale, rot)
+        viewportSize, space=None, editorMode=False, debugMode=False, streaming=False,
+        broadphase=None):
+        tracer.begin("parseMapFile", "load", {'file': fileName})
+        try:
+            tracer.begin("levelfile.load", "load")
+            try:
+                data = levelfile.load(fileName)
+            finally:
+                tracer.end("levelfile.load", "load")
+            return cls.fromLevelData(data, batch, resourceLoader, viewportSize, space=space,
+                editorMode=editorMode, debugMode=debugMode, streaming=streaming,
+                broadphase=broadphase)
+        finally:
+            tracer.end("parseMapFile", "load")
+            
+    @classmethod
+    def fromLevelData(cls, data, batch, resourceLoader, 
+        viewportSize, space=None, editorMode=False, debugMode=False, streaming=False,
+        broadphase=None):
+        tracer.begin("fromLevelData", "load", {'level': data.name})
+        try:
+            graph = cls(data.name, batch, resourceLoader, viewportSize, data.width, data.height, 
+                space=space, editorMode=editorMode, debugMode=debugMode, broadphase=broadphase)
+            tracer.begin("terrain", "load")
+            try:
+                if streaming == True:
+                    graph.streamer = ChunkStreamer(graph)
+                    # streamed lines only exist for the game, so they are
+                    # simplified before being split into chunks
+                    lines = graph.simplifyTerrain(data.lines())
+                    for x1, y1, x2, y2 in lines:
+                        graph.streamer.addLine(x1, y1, x2, y2)
                 else:
-                    layer = graph.layers[child.get('name')]
-                    for item in child:
-                        name = item.get('name')
-                        x = int(item.get('x'))
-                        y = int(item.get('y'))
-                        rot = 0
-                        scale = 1.0
-                        for c in item:
-                            if c.tag == "rotation":
-                                rot = int(c.text)
-                            if c.tag == "scale":
-                                scale = float(c.text)
-                        layer.addItem(name, (x,y), scale, rot)
+                    graph.layers['terrain'].addLines(data.lines())
+            finally:
+                tracer.end("terrain", "load")
+            layer = graph.layers['object']
+            tracer.begin("addItem object", "load", {'items': len(data.objects)})
+            try:
+                for name, x, y, scale, rot in data.items(data.objects):
+                    layer.addItem(name, (x,y), scale, rot)
+            finally:
+                tracer.end("addItem object", "load")
+            for nameId, items in data.aesthetics:
+                layer = graph.layers[data.strings[nameId]]
+                if graph.streamer is not None:
+                    addItem = partial(graph.streamer.addItem, layer.name)
+                else:
+                    addItem = layer.addItem
+                tracer.begin("addItem " + layer.name, "load", {'items': len(items)})
+                try:
+                    for name, x, y, scale, rot in data.items(items):
+                        addItem(name, (x,y), scale, rot)
+                finally:
+                    tracer.end("addItem " + layer.name, "load")
             if space is not None:
                 graph.generatePhysics()
+            graph.updateView()
             return graph
-        except ET.ParseError as err:
-            raise FileLoadFailedException(str(err))
-        #TODO catch all xml reading exceptions
+        finally:
+            tracer.end("fromLevelData", "load")
         
+    '''
+        returns the resource names of the images level data's items
+        are drawn with, for preloading before the graph is built
+    '''
+    @staticmethod
+    def levelImages(data):
+        names = set()
+        for nameId in data.objects.names:
+            names.add(ObjectLayer.dir + "/" + data.strings[nameId] + ".png")
+        for layerId, items in data.aesthetics:
+            for nameId in items.names:
+                names.add(AestheticLayer.dir + "/" + data.strings[nameId] + ".png")
+        return names
+        
+    '''
+        saves graph to compiled level file
+    '''
+    def saveCompiled(self, filename):
+        levelfile.writeCompiled(levelfile.LevelData.fromGraph(self), filename)
+        
+    def makeSegment(self, a, b):
+        seg = pymunk.Segment(self.space.static_body, a, b, self.SEGMENT_RADIUS)
+        seg.friction = 1.
+        seg.group = 1
+        return seg
+        
+    '''
+        returns lines with endpoints welded, degenerate lines dropped
+        and straight runs merged, see terrain.simplify
+    '''
+    def simplifyTerrain(self, lines):
+        lines, removed = terrain.simplify(lines)
+        self.terrainRemoved = removed
+        if self.debugMode == True:
+            print "terrain simplified to %d segments, %d removed" % (len(lines), removed)
+        return lines
         
     def generatePhysics(self):
         '''terrain layer and visuals with line'''
-        layer = self.layers['terrain']
-        self.platformSegs = list()
-        for line in layer.lines:
-            seg = pymunk.Segment(self.space.static_body, (line.x1, line.y1), (line.x2, line.y2), 5)
-            self.platformSegs.append(seg)
-        '''vertical side lines'''
-        self.platformSegs.append(pymunk.Segment(self.space.static_body, (0, 0), (0, self.height), 5))
-        self.platformSegs.append(pymunk.Segment(self.space.static_body, (self.width, 0), (self.width, self.height), 5))
-        for seg in self.platformSegs:
-            seg.friction = 1.
-            seg.group = 1
-        self.space.add(self.platformSegs)
+        tracer.begin("generatePhysics", "load")
+        try:
+            layer = self.layers['terrain']
+            self.platformSegs = list()
+            # streamed terrain gets its segments as chunks load
+            if self.streamer is None:
+                lines = ((line.x1, line.y1, line.x2, line.y2) for line in layer.lines)
+                lines = self.simplifyTerrain(lines)
+                for x1, y1, x2, y2 in lines:
+                    self.platformSegs.append(self.makeSegment((x1, y1), (x2, y2)))
+            else:
+                lines = self.streamer.lines
+            applied = self.broadphase.apply(self.space, self.width, self.height,
+                lines, self.SEGMENT_RADIUS)
+            if self.debugMode == True:
+                print "physics broadphase %s" % (applied,)
+            '''vertical side lines'''
+            self.platformSegs.append(self.makeSegment((0, 0), (0, self.height)))
+            self.platformSegs.append(self.makeSegment((self.width, 0), (self.width, self.height)))
+            self.space.add(self.platformSegs)
+        finally:
+            tracer.end("generatePhysics", "load")
         
      
     '''
@@ -617,10 +940,32 @@ class SceneGraph(object):
         
         self.focusX = x
         self.focusY = y
-        self.backgroundGroup.setFocus(x,y)
-        # update layers
+        self.camera.setFocus(x, y)
+        self.updateView()
+        
+    def setViewScale(self, scale):
+        # zooming out past zero shows nothing, keep the rect finite
+        self.viewScale = max(scale, 0.1)
+        self.updateView()
+        
+    '''
+        returns the world rectangle visible through the viewport
+        at current focus, grown by the cull margin.
+    '''
+    def getViewRect(self):
+        margin = self.cullMargin
+        x1 = -self.focusX - margin
+        y1 = -self.focusY - margin
+        x2 = -self.focusX + self.viewportWidth / self.viewScale + margin
+        y2 = -self.focusY + self.viewportHeight / self.viewScale + margin
+        return (x1, y1, x2, y2)
+        
+    def updateView(self):
+        rect = self.getViewRect()
+        if self.streamer is not None:
+            self.streamer.update(rect)
         for layer in self.layers:
-            layer.group.setFocus(x, y)
+            layer.setViewRect(rect)
             
     def on_focus_update(self, x, y):
         pass
@@ -0,0 +1,176 @@
+'''
+Spatial indexing for scene items.
+
+SpatialHash buckets items by the grid cells their axis aligned
+bounds cover, so point and rectangle queries only look at the
+handful of items near the query instead of the whole layer.
+'''
+import math
+
+
+def rotatedBounds(x, y, width, height, rot):
+    '''
+        returns the axis aligned bounds (x1, y1, x2, y2) of a
+        width by height rectangle anchored at x,y and rotated
+        clockwise by rot degrees about that anchor, the same way
+        pyglet sprites are rotated.
+    '''
+    if not rot:
+        return (x, y, x + width, y + height)
+    r = -math.radians(rot)
+    cr = math.cos(r)
+    sr = math.sin(r)
+    xs = []
+    ys = []
+    for (cx, cy) in ((0, 0), (width, 0), (width, height), (0, height)):
+        xs.append(cx * cr - cy * sr + x)
+        ys.append(cx * sr + cy * cr + y)
+    return (min(xs), min(ys), max(xs), max(ys))
+
+
+def segmentDistanceSq(px, py, x1, y1, x2, y2):
+    ''' returns squared distance from point px,py to segment x1,y1 x2,y2 '''
+    dx = x2 - x1
+    dy = y2 - y1
+    lengthSq = dx * dx + dy * dy
+    if lengthSq > 0:
+        t = ((px - x1) * dx + (py - y1) * dy) / lengthSq
+        if t > 1:
+            t = 1
+        elif t < 0:
+            t = 0
+        x1 += t * dx
+        y1 += t * dy
+    return (px - x1) * (px - x1) + (py - y1) * (py - y1)
+
+def segmentIntersectsRect(x1, y1, x2, y2, rx1, ry1, rx2, ry2):
+    '''
+        returns whether segment x1,y1 x2,y2 passes through the
+        axis aligned rectangle, clipping it against each edge.
+    '''
+    t0 = 0.
+    t1 = 1.
+    dx = float(x2 - x1)
+    dy = float(y2 - y1)
+    for p, q in ((-dx, x1 - rx1), (dx, rx2 - x1), (-dy, y1 - ry1), (dy, ry2 - y1)):
+        if p == 0:
+            if q < 0:
+                return False
+            continue
+        t = q / p
+        if p < 0:
+            if t > t1:
+                return False
+            t0 = max(t0, t)
+        else:
+            if t < t0:
+                return False
+            t1 = min(t1, t)
+    return True
+
+
+'''
+    class SpatialHash
+    uniform grid of cells, each cell holding the items whose
+    bounds overlap it.
+'''
+class SpatialHash(object):
+    def __init__(self, cellSize=256):
+        self.cellSize = float(cellSize)
+        self.cells = dict()
+        # item -> (bounds, cell range) it is currently stored under
+        self.entries = dict()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, item):
+        return item in self.entries
+
+    def _cellRange(self, (x1, y1, x2, y2)):
+        size = self.cellSize
+        return (int(math.floor(x1 / size)), int(math.floor(y1 / size)),
+            int(math.floor(x2 / size)), int(math.floor(y2 / size)))
+
+    def insert(self, item, bounds):
+        if item in self.entries:
+            self.remove(item)
+        cx1, cy1, cx2, cy2 = cellRange = self._cellRange(bounds)
+        cells = self.cells
+        for cx in xrange(cx1, cx2 + 1):
+            for cy in xrange(cy1, cy2 + 1):
+                try:
+                    cells[(cx, cy)].append(item)
+                except KeyError:
+                    cells[(cx, cy)] = [item]
+        self.entries[item] = (bounds, cellRange)
+
+    def remove(self, item):
+        try:
+            bounds, (cx1, cy1, cx2, cy2) = self.entries.pop(item)
+        except KeyError:
+            return
+        cells = self.cells
+        for cx in xrange(cx1, cx2 + 1):
+            for cy in xrange(cy1, cy2 + 1):
+                cell = cells[(cx, cy)]
+                cell.remove(item)
+                if len(cell) == 0:
+                    del cells[(cx, cy)]
+
+    def update(self, item, bounds):
+        ''' moves item to new bounds, only touching cells when the
+            covered cell range actually changes '''
+        entry = self.entries.get(item)
+        if entry is not None and entry[1] == self._cellRange(bounds):
+            self.entries[item] = (bounds, entry[1])
+            return
+        self.insert(item, bounds)
+
+    def clear(self):
+        self.cells = dict()
+        self.entries = dict()
+
+    def getBounds(self, item):
+        return self.entries[item][0]
+
+    def queryPoint(self, x, y):
+        '''
+            returns the items whose bounds contain point, in the
+            order they were inserted into the point's cell.
+        '''
+        size = self.cellSize
+        cell = self.cells.get((int(math.floor(x / size)), int(math.floor(y / size))))
+        if cell is None:
+            return []
+        entries = self.entries
+        found = []
+        for item in cell:
+            x1, y1, x2, y2 = entries[item][0]
+            if x >= x1 and x <= x2 and y >= y1 and y <= y2:
+                found.append(item)
+        return found
+
+    def queryRect(self, x1, y1, x2, y2):
+        '''
+            returns set of items whose bounds overlap given rectangle
+        '''
+        cx1, cy1, cx2, cy2 = self._cellRange((x1, y1, x2, y2))
+        cells = self.cells
+        entries = self.entries
+        found = set()
+        if (cx2 - cx1 + 1) * (cy2 - cy1 + 1) > len(cells):
+            # query covers more cells than are occupied
+            candidates = cells.itervalues()
+        else:
+            candidates = (cells[key] for key in
+                ((cx, cy) for cx in xrange(cx1, cx2 + 1) for cy in xrange(cy1, cy2 + 1))
+                if key in cells)
+        for cell in candidates:
+            for item in cell:
+                if item in found:
+                    continue
+                ix1, iy1, ix2, iy2 = entries[item][0]
+                if ix1 <= x2 and ix2 >= x1 and iy1 <= y2 and iy2 >= y1:
+                    found.add(item)
+        return found
@@ -0,0 +1,169 @@
+'''
+Chunked level streaming.
+
+The level is split into square world chunks. The streamer only keeps
+light records of the terrain lines and aesthetic items in each chunk,
+and creates sprites, vertex lists and physics segments for the chunks
+near the camera, evicting them again once the camera has moved away.
+
+Streaming is off unless a LevelScene is made with streaming=True,
+which main.py's --stream option does. Only terrain and aesthetic
+items stream, the object layer and the actors it places are still
+loaded with the level, and the scene suspends actors while the
+terrain around them isn't loaded.
+'''
+import math
+from appEngine.trace import tracer
+
+# screens around the view kept live. chunks this far out are loaded
+# and the scene simulates the actors this far out, so no actor is
+# ever simulated over terrain that isn't there
+LOAD_SCREENS = 1
+
+
+'''
+    class Chunk
+    records of the level content whose position falls in one chunk
+'''
+class Chunk(object):
+    def __init__(self):
+        self.lines = [] # indices into streamer line records
+        self.items = [] # (layer name, item name, (x, y), scale, rot)
+        self.loadedItems = [] # (layer, item) pairs while loaded
+
+
+'''
+    class ChunkStreamer
+    loads and evicts chunks of a scene graph around the camera.
+'''
+class ChunkStreamer(object):
+    CHUNK_SIZE = 512
+    LOAD_SCREENS = LOAD_SCREENS
+
+    def __init__(self, graph, chunkSize=CHUNK_SIZE, loadScreens=LOAD_SCREENS):
+        self.graph = graph
+        self.chunkSize = float(chunkSize)
+        self.loadScreens = loadScreens
+        self.chunks = dict()
+        self.lines = []
+        # line record index -> [refcount, Line, physics segment]
+        self.loadedLines = dict()
+        self.loaded = set()
+        self.loadRange = None
+
+    def _cellRange(self, x1, y1, x2, y2):
+        size = self.chunkSize
+        return (int(math.floor(x1 / size)), int(math.floor(y1 / size)),
+            int(math.floor(x2 / size)), int(math.floor(y2 / size)))
+
+    def _chunk(self, key):
+        try:
+            return self.chunks[key]
+        except KeyError:
+            chunk = self.chunks[key] = Chunk()
+            return chunk
+
+    def addLine(self, x1, y1, x2, y2):
+        ''' records a terrain line in every chunk it passes over '''
+        index = len(self.lines)
+        self.lines.append((x1, y1, x2, y2))
+        cx1, cy1, cx2, cy2 = self._cellRange(min(x1, x2), min(y1, y2),
+            max(x1, x2), max(y1, y2))
+        for cx in xrange(cx1, cx2 + 1):
+            for cy in xrange(cy1, cy2 + 1):
+                self._chunk((cx, cy)).lines.append(index)
+
+    def addItem(self, layerName, name, (x, y), scale, rot):
+        ''' records an aesthetic item in the chunk of its anchor '''
+        size = self.chunkSize
+        key = (int(math.floor(x / size)), int(math.floor(y / size)))
+        self._chunk(key).items.append((layerName, name, (x, y), scale, rot))
+
+    '''
+        loads chunks within loadScreens of the view and evicts
+        the ones a screen further out than that.
+    '''
+    def update(self, viewRect):
+        x1, y1, x2, y2 = viewRect
+        padX = self.graph.viewportWidth * self.loadScreens
+        padY = self.graph.viewportHeight * self.loadScreens
+        loadRange = self._cellRange(x1 - padX, y1 - padY, x2 + padX, y2 + padY)
+        if loadRange == self.loadRange:
+            return
+        self.loadRange = loadRange
+        # evict with a screen of hysteresis so chunks on the
+        # border don't thrash while the camera hovers there.
+        ex1, ey1, ex2, ey2 = self._cellRange(x1 - padX * 2, y1 - padY * 2,
+            x2 + padX * 2, y2 + padY * 2)
+        for key in list(self.loaded):
+            cx, cy = key
+            if cx < ex1 or cx > ex2 or cy < ey1 or cy > ey2:
+                self.evictChunk(key)
+        lx1, ly1, lx2, ly2 = loadRange
+        for cx in xrange(lx1, lx2 + 1):
+            for cy in xrange(ly1, ly2 + 1):
+                key = (cx, cy)
+                if key not in self.loaded and key in self.chunks:
+                    self.loadChunk(key)
+
+    def isLoaded(self, x1, y1, x2, y2):
+        ''' whether the terrain of every chunk over a world rect is loaded '''
+        cx1, cy1, cx2, cy2 = self._cellRange(x1, y1, x2, y2)
+        for cx in xrange(cx1, cx2 + 1):
+            for cy in xrange(cy1, cy2 + 1):
+                key = (cx, cy)
+                # chunks with nothing in them are never loaded
+                if key not in self.loaded and key in self.chunks:
+                    return False
+        return True
+
+    def loadChunk(self, key):
+        tracer.begin("loadChunk", "load", {'chunk': key})
+        try:
+            chunk = self.chunks[key]
+            graph = self.graph
+            terrain = graph.layers['terrain']
+            added = []
+            for index in chunk.lines:
+                try:
+                    self.loadedLines[index][0] += 1
+                except KeyError:
+                    seg = None
+                    if graph.space is not None:
+                        x1, y1, x2, y2 = self.lines[index]
+                        seg = graph.makeSegment((x1, y1), (x2, y2))
+                        graph.space.add(seg)
+                    self.loadedLines[index] = [1, None, seg]
+                    added.append(index)
+            # the chunk's new lines go into the terrain vertex list at once
+            lines = terrain.addLines([self.lines[index] for index in added])
+            for index, line in zip(added, lines):
+                self.loadedLines[index][1] = line
+            for (layerName, name, pos, scale, rot) in chunk.items:
+                layer = graph.layers[layerName]
+                chunk.loadedItems.append((layer, layer.addItem(name, pos, scale, rot)))
+            self.loaded.add(key)
+        finally:
+            tracer.end("loadChunk", "load")
+
+    def evictChunk(self, key):
+        chunk = self.chunks[key]
+        graph = self.graph
+        terrain = graph.layers['terrain']
+        for index in chunk.lines:
+            entry = self.loadedLines[index]
+            entry[0] -= 1
+            if entry[0] == 0:
+                del self.loadedLines[index]
+                terrain.removeLine(entry[1])
+                if entry[2] is not None:
+                    graph.space.remove(entry[2])
+        for (layer, item) in chunk.loadedItems:
+            layer.removeItem(item)
+        chunk.loadedItems = []
+        self.loaded.discard(key)
+
+    def unload(self):
+        for key in list(self.loaded):
+            self.evictChunk(key)
+        self.loadRange = None
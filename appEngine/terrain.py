@@ -0,0 +1,121 @@
+'''
+Terrain simplification.
+
+Hand drawn terrain is full of endpoints that nearly meet, tiny and
+zero length lines, and long runs of lines that are very nearly
+straight. simplify() cleans a set of lines up before they become
+static physics segments, so pymunk has far fewer shapes to test.
+'''
+import math
+
+# endpoints closer than this are joined into one point
+WELD_DISTANCE = 4.0
+# a run of lines is merged into one while no joint it absorbs
+# strays further than this from the merged line
+MERGE_DISTANCE = 1.5
+
+
+def _pointLineDistance(px, py, (x1, y1), (x2, y2)):
+    ''' distance of point from segment, or None if it falls outside it '''
+    dx = x2 - x1
+    dy = y2 - y1
+    lengthSq = float(dx * dx + dy * dy)
+    t = ((px - x1) * dx + (py - y1) * dy) / lengthSq
+    if t < 0 or t > 1:
+        return None
+    return abs((px - x1) * dy - (py - y1) * dx) / math.sqrt(lengthSq)
+
+
+'''
+    class Welder
+    maps points to the first point seen within weld distance of
+    them, bucketed on a grid of weld distance sized cells.
+'''
+class Welder(object):
+    def __init__(self, distance=WELD_DISTANCE):
+        self.distance = float(distance)
+        self.cells = dict()
+
+    def weld(self, x, y):
+        size = self.distance
+        cx = int(math.floor(x / size))
+        cy = int(math.floor(y / size))
+        best = None
+        bestDist = size * size
+        for key in ((cx + i, cy + j) for i in (-1, 0, 1) for j in (-1, 0, 1)):
+            for (px, py) in self.cells.get(key, ()):
+                dist = (px - x) * (px - x) + (py - y) * (py - y)
+                if dist <= bestDist:
+                    best = (px, py)
+                    bestDist = dist
+        if best is None:
+            best = (x, y)
+            self.cells.setdefault((cx, cy), []).append(best)
+        return best
+
+
+def simplify(lines, weldDistance=WELD_DISTANCE, mergeDistance=MERGE_DISTANCE):
+    '''
+        takes a sequence of (x1, y1, x2, y2) and returns
+        (simplified list of (x1, y1, x2, y2), number of lines removed).
+
+        endpoints within weldDistance are welded together, lines that
+        end up zero length or duplicating another are dropped, and
+        pairs of lines meeting at a joint no other line touches are
+        merged while the result stays within mergeDistance of every
+        joint merged away.
+    '''
+    welder = Welder(weldDistance)
+    # line id -> [end a, end b, joints merged into it]
+    segs = dict()
+    pointSegs = dict()
+    seen = set()
+    count = 0
+    for x1, y1, x2, y2 in lines:
+        count += 1
+        a = welder.weld(x1, y1)
+        b = welder.weld(x2, y2)
+        key = (min(a, b), max(a, b))
+        if a == b or key in seen:
+            continue
+        seen.add(key)
+        segId = len(segs)
+        segs[segId] = [a, b, []]
+        pointSegs.setdefault(a, []).append(segId)
+        pointSegs.setdefault(b, []).append(segId)
+
+    for point, ids in pointSegs.iteritems():
+        if len(ids) != 2:
+            continue
+        first, second = ids
+        segA = segs[first]
+        segB = segs[second]
+        outA = segA[1] if segA[0] == point else segA[0]
+        outB = segB[1] if segB[0] == point else segB[0]
+        if outA == outB:
+            continue
+        joints = segA[2] + segB[2] + [point]
+        fits = True
+        for (px, py) in joints:
+            dist = _pointLineDistance(px, py, outA, outB)
+            if dist is None or dist > mergeDistance:
+                fits = False
+                break
+        if fits == False:
+            continue
+        key = (min(outA, outB), max(outA, outB))
+        if key in seen:
+            continue
+        seen.add(key)
+        # second line is folded into the first, which now spans
+        # both outer ends
+        segA[0] = outA
+        segA[1] = outB
+        segA[2] = joints
+        del segs[second]
+        del ids[:]
+        otherIds = pointSegs[outB]
+        otherIds[otherIds.index(second)] = first
+
+    simplified = [segs[segId][0] + segs[segId][1] for segId in sorted(segs)]
+    return simplified, count - len(simplified)
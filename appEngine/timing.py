@@ -0,0 +1,169 @@
+'''
+Frame timing instrumentation.
+
+Code marks named spans with begin and end, and the time spent in
+each is summed over a frame and kept for the last few seconds of
+frames. While timing is disabled begin and end return at once.
+TimingOverlay draws the history as a rolling graph with a table of
+averages and maxima.
+'''
+from collections import deque
+from timeit import default_timer as clock
+import pyglet
+from pyglet.gl import GL_QUADS, GL_LINES
+
+# frames of history kept for each span
+FRAMES = 120
+# name of the span covering whole frames
+FRAME = 'frame'
+
+
+'''
+    class Timings
+    seconds spent in named spans per frame.
+'''
+class Timings(object):
+    def __init__(self, frames=FRAMES):
+        self.enabled = False
+        self.frames = frames
+        self.starts = dict()
+        # span name -> seconds so far this frame
+        self.current = dict()
+        # span name -> seconds of each of the last frames
+        self.history = dict()
+        # names of the spans with history
+        self.names = []
+        self.lastFrame = None
+
+    def setEnabled(self, value):
+        if value and not self.enabled:
+            self.reset()
+        self.enabled = value
+
+    def reset(self):
+        self.starts = dict()
+        self.current = dict()
+        self.history = dict()
+        self.names = []
+        self.lastFrame = None
+
+    def begin(self, name):
+        if self.enabled:
+            self.starts[name] = clock()
+
+    def end(self, name):
+        if self.enabled:
+            start = self.starts.pop(name, None)
+            if start is not None:
+                self.current[name] = self.current.get(name, 0.) + clock() - start
+
+    def frameDone(self):
+        ''' closes the frame, spans not run in it record nothing spent '''
+        if not self.enabled:
+            return
+        now = clock()
+        if self.lastFrame is not None:
+            self.current[FRAME] = now - self.lastFrame
+        self.lastFrame = now
+        current = self.current
+        for name in current:
+            if name not in self.history:
+                self.history[name] = deque(maxlen=self.frames)
+                self.names.append(name)
+        for name, frames in self.history.iteritems():
+            frames.append(current.get(name, 0.))
+        self.current = dict()
+
+    def stats(self, name):
+        ''' returns (average, maximum) seconds per frame of span '''
+        frames = self.history.get(name)
+        if not frames:
+            return 0., 0.
+        return sum(frames) / len(frames), max(frames)
+
+
+# timings of the running game
+timings = Timings()
+
+
+'''
+    class TimingOverlay
+    draws the timings of the chosen spans as stacked bars, one a
+    frame, beside a table of every span. drawn in window coordinates.
+'''
+class TimingOverlay(object):
+    GRAPH_SPANS = ('physics', 'actors', 'sprites', 'camera', 'activation', 'draw')
+    COLORS = [(230, 80, 80), (80, 200, 80), (80, 140, 240), (230, 200, 60),
+        (200, 90, 220), (90, 220, 220)]
+    BAR_WIDTH = 2
+    # graph pixels per millisecond
+    SCALE = 3
+    # frames between rewrites of the table text
+    REFRESH = 15
+
+    def __init__(self, timings, x=10, y=10, spans=GRAPH_SPANS, notes=None):
+        self.timings = timings
+        self.x = x
+        self.y = y
+        self.spans = spans
+        # returns more text to show under the table
+        self.notes = notes
+        self.label = None
+        self.frame = 0
+
+    def tableText(self):
+        timings = self.timings
+        lines = ["%-12s %7s %7s" % ("span", "avg ms", "max ms")]
+        # whole frame last, the spans making it up above it
+        for name in sorted(timings.names, key=lambda name: (name == FRAME, name)):
+            average, maximum = timings.stats(name)
+            lines.append("%-12s %7.2f %7.2f" % (name, average * 1000, maximum * 1000))
+        average = timings.stats(FRAME)[0]
+        if average > 0:
+            lines.append("%.1f fps" % (1. / average))
+        if self.notes is not None:
+            lines.append(self.notes())
+        return "\n".join(lines)
+
+    def draw(self):
+        timings = self.timings
+        graphWidth = timings.frames * self.BAR_WIDTH
+        if self.label is None:
+            self.label = pyglet.text.Label("", font_name="Courier New", font_size=9,
+                x=self.x + graphWidth + 10, y=self.y, anchor_y='bottom',
+                multiline=True, width=420)
+        if self.frame % self.REFRESH == 0:
+            self.label.text = self.tableText()
+        self.frame += 1
+        vertices = []
+        colors = []
+        w = self.BAR_WIDTH
+        scale = self.SCALE * 1000
+        # height stacked so far in each column, newest frame first
+        stacked = [0.] * timings.frames
+        for index, name in enumerate(self.spans):
+            frames = timings.history.get(name)
+            if not frames:
+                continue
+            color = self.COLORS[index % len(self.COLORS)]
+            count = len(frames)
+            # newest frame at the right edge
+            x = self.x + graphWidth - count * w
+            for i, seconds in enumerate(frames):
+                age = count - 1 - i
+                bottom = self.y + stacked[age]
+                height = seconds * scale
+                stacked[age] += height
+                vertices.extend((x, bottom, x + w, bottom, x + w, bottom + height, x, bottom + height))
+                x += w
+            colors.extend(color * (count * 4))
+        # 60 and 30 fps marks
+        lines = []
+        for ms in (1000 / 60., 1000 / 30.):
+            y = self.y + ms * self.SCALE
+            lines.extend((self.x, y, self.x + graphWidth, y))
+        if vertices:
+            pyglet.graphics.draw(len(vertices) // 2, GL_QUADS, ('v2f', vertices), ('c3B', colors))
+        pyglet.graphics.draw(len(lines) // 2, GL_LINES, ('v2f', lines),
+            ('c3B', (120, 120, 120) * (len(lines) // 2)))
+        self.label.draw()
@@ -0,0 +1,114 @@
+'''
+Timeline tracing.
+
+Records nested begin and end spans from any thread and writes them
+in the Chrome trace event format, for viewing in chrome://tracing
+or Perfetto. While tracing is stopped begin and end return at once.
+'''
+import os
+import json
+import atexit
+import itertools
+import threading
+from timeit import default_timer as clock
+
+# memory the recorded events may take, recording stops once full
+MAX_BYTES = 64 * 1024 * 1024
+# rough size of one recorded event, its tuple, timestamp and list slot
+EVENT_BYTES = 160
+MAX_EVENTS = MAX_BYTES // EVENT_BYTES
+
+
+'''
+    class Tracer
+    begin and end events of named spans, timestamped in microseconds
+    from when tracing started. events are kept as compact tuples of
+    (phase, name, category, clock time, thread id, args) in a list
+    allocated when tracing starts, and made into trace events by dump.
+'''
+class Tracer(object):
+    def __init__(self, maxEvents=MAX_EVENTS):
+        self.enabled = False
+        self.filename = None
+        self.maxEvents = maxEvents
+        self.events = []
+        # hands out event slots, next() on it is atomic so threads
+        # need no lock
+        self.slots = itertools.count()
+        # thread id -> name, taken when a thread first records, as
+        # threads that have finished by dump time can't be asked
+        self.threadNames = dict()
+        self.startTime = 0.
+        self.pid = os.getpid()
+        self.exitRegistered = False
+
+    def start(self, filename):
+        ''' starts recording, events are written to filename on exit '''
+        self.filename = filename
+        self.events = [None] * self.maxEvents
+        self.slots = itertools.count()
+        self.threadNames = dict()
+        self.startTime = clock()
+        self.enabled = True
+        if not self.exitRegistered:
+            atexit.register(self.exitDump)
+            self.exitRegistered = True
+
+    def stop(self):
+        self.enabled = False
+
+    def begin(self, name, category="engine", args=None):
+        if self.enabled:
+            self.record('B', name, category, args)
+
+    def end(self, name, category="engine"):
+        if self.enabled:
+            self.record('E', name, category, None)
+
+    def record(self, phase, name, category, args):
+        now = clock()
+        thread = threading.current_thread()
+        tid = thread.ident
+        if tid not in self.threadNames:
+            self.threadNames[tid] = thread.name
+        i = next(self.slots)
+        if i >= self.maxEvents:
+            if self.enabled:
+                self.enabled = False
+                print "trace stopped at %d events" % self.maxEvents
+            return
+        self.events[i] = (phase, name, category, now, tid, args)
+
+    def recorded(self):
+        ''' events recorded so far, in the order their slots were taken '''
+        return [event for event in self.events if event is not None]
+
+    def dump(self, filename=None):
+        ''' writes every event so far, recording carries on '''
+        if filename is None:
+            filename = self.filename
+        names = dict(self.threadNames)
+        for thread in threading.enumerate():
+            names.setdefault(thread.ident, thread.name)
+        pid = self.pid
+        start = self.startTime
+        events = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid,
+            'args': {'name': name}} for tid, name in names.iteritems()]
+        recorded = self.recorded()
+        for phase, name, category, seconds, tid, args in recorded:
+            event = {'name': name, 'cat': category, 'ph': phase,
+                'ts': (seconds - start) * 1e6, 'pid': pid, 'tid': tid}
+            if args is not None:
+                event['args'] = args
+            events.append(event)
+        with open(filename, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+        print "trace of %d events written to %s" % (len(recorded), filename)
+
+    def exitDump(self):
+        if self.filename is not None and any(event is not None for event in self.events):
+            self.dump()
+
+
+# tracer of the running game
+tracer = Tracer()
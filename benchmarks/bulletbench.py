@@ -0,0 +1,116 @@
+'''
+Projectile pool benchmark.
+
+Loads a synthetic level with its terrain in a physics space and
+keeps a number of bullets alive in a BulletPool, refiring any that
+hit or expire, then times pool updates for each bullet count,
+writing the results as json.
+
+run from the project root:
+    python2 -m benchmarks.bulletbench [options]
+'''
+import os
+import json
+import time
+import math
+import random
+import shutil
+import tempfile
+import platform
+from timeit import default_timer as clock
+from optparse import OptionParser
+
+import pyglet
+pyglet.options['debug_gl'] = False
+import pymunk
+import appEngine
+from appEngine import rLoader
+from appEngine.scenegraph import SceneGraph
+from benchmarks import genlevel
+from game.bullet import BulletPool, BULLET_SPEED
+
+VIEWPORT = (1280, 720)
+DEFAULT_COUNTS = "1000,5000,10000"
+WARMUP_STEPS = 30
+STEPS = 120
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+def refill(pool, count, width, height, rand):
+    while pool.count < count:
+        angle = rand.uniform(0, math.pi * 2)
+        pool.fire(rand.uniform(0, width), rand.uniform(0, height),
+            math.cos(angle) * BULLET_SPEED, math.sin(angle) * BULLET_SPEED)
+
+def benchCount(graph, space, batch, count, seed=0):
+    rand = random.Random(seed)
+    pool = BulletPool()
+    pool.attach(space, batch, None, (0, 0, graph.width, graph.height))
+    refill(pool, count, graph.width, graph.height, rand)
+    for i in xrange(WARMUP_STEPS):
+        pool.update(1/60.)
+        refill(pool, count, graph.width, graph.height, rand)
+    times = []
+    spent = 0
+    for i in xrange(STEPS):
+        start = clock()
+        pool.update(1/60.)
+        times.append(clock() - start)
+        spent += count - pool.count
+        refill(pool, count, graph.width, graph.height, rand)
+    pool.unload()
+    return {
+        'bullets': count,
+        'update': median(times),
+        'updateMax': max(times),
+        'perBullet': median(times) / count,
+        'spentPerStep': spent / float(STEPS),
+    }
+
+def run(size, counts, outFile):
+    workDir = tempfile.mkdtemp(prefix="bulletbench")
+    report = {
+        'engineVersion': appEngine.version,
+        'python': platform.python_version(),
+        'pymunk': pymunk.version,
+        'platform': platform.platform(),
+        'time': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'lines': size,
+        'results': [],
+    }
+    try:
+        filename = os.path.join(workDir, "bench%d.lvl" % size)
+        genlevel.generate(filename, size, 0, 0)
+        space = pymunk.Space()
+        batch = pyglet.graphics.Batch()
+        graph = SceneGraph.parseMapFile(filename, batch, rLoader, VIEWPORT, space=space)
+        report['segments'] = len(graph.platformSegs)
+        print "level size %d, %d segments" % (size, report['segments'])
+        for count in counts:
+            result = benchCount(graph, space, batch, count)
+            print "    %6d bullets update %.6f max %.6f spent/step %.1f" % (count,
+                result['update'], result['updateMax'], result['spentPerStep'])
+            report['results'].append(result)
+            with open(outFile, 'w') as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+        graph.unload(False)
+    finally:
+        shutil.rmtree(workDir)
+    return report
+
+
+if __name__ == '__main__':
+    parser = OptionParser()
+    parser.add_option("-s", "--size", dest="size", type="int", default=10000,
+                        help="terrain line count of the generated level")
+    parser.add_option("-n", "--bullets", dest="counts", default=DEFAULT_COUNTS,
+                        help="comma separated live bullet counts to time")
+    parser.add_option("-o", "--out", dest="out", default="bulletbench.json",
+                        help="json file to write results to")
+    (options, args) = parser.parse_args()
+    appEngine.setResourcePath(["assets"])
+    counts = [int(s) for s in options.counts.split(",")]
+    run(options.size, counts, options.out)
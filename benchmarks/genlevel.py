@@ -0,0 +1,80 @@
+'''
+Synthetic level generator.
+
+Writes .lvl files with a chosen number of terrain lines, object items
+and aesthetic items, for measuring how the engine scales.
+
+usage: python2 -m benchmarks.genlevel [options] OUTFILE
+'''
+import random
+from optparse import OptionParser
+from xml.sax.saxutils import quoteattr
+
+VISUALS = ["genesis", "ipod", "nes", "rect", "snes"]
+OBJECTS = ["star"]
+# world width given to each terrain line of the generated ground
+LINE_SPACING = 40
+LEVEL_HEIGHT = 1420
+
+
+def levelWidth(lines, objects, aesthetics):
+    ''' wide enough that items are spread at the densities of a hand made level '''
+    return max(4000, lines * LINE_SPACING, objects * 20, aesthetics * 20)
+
+def generate(filename, lines, objects, aesthetics, seed=0, name="generated"):
+    '''
+        writes level with given counts to filename, written
+        piece by piece so million item levels don't need a tree
+        in memory.
+    '''
+    rand = random.Random(seed)
+    width = levelWidth(lines, objects, aesthetics)
+    height = LEVEL_HEIGHT
+    with open(filename, 'w') as f:
+        f.write('<map height="%d" width="%d"><head><name>%s</name></head><layers>'
+            % (height, width, name))
+        if lines > 0:
+            # a connected ground line wandering across the level
+            f.write('<terrainlayer>')
+            step = float(width) / lines
+            x1, y1 = 0, rand.randint(100, height // 2)
+            for i in xrange(lines):
+                x2 = int((i + 1) * step)
+                y2 = min(height - 100, max(20, y1 + rand.randint(-30, 30)))
+                f.write('<line x1="%d" x2="%d" y1="%d" y2="%d" />' % (x1, x2, y1, y2))
+                x1, y1 = x2, y2
+            f.write('</terrainlayer>')
+        f.write('<objectlayer>')
+        f.write('<item name="levelstart" x="277" y="%d" />' % (height // 2))
+        for i in xrange(objects):
+            f.write('<item name=%s x="%d" y="%d" />' % (quoteattr(rand.choice(OBJECTS)),
+                rand.randint(0, width), rand.randint(0, height)))
+        f.write('</objectlayer>')
+        if aesthetics > 0:
+            f.write('<aestheticlayer name="foreground" opacity="1.0" visible="True">')
+            for i in xrange(aesthetics):
+                f.write('<item name=%s x="%d" y="%d">' % (quoteattr(rand.choice(VISUALS)),
+                    rand.randint(0, width), rand.randint(0, height)))
+                if rand.random() < 0.25:
+                    f.write('<rotation>%d</rotation>' % rand.choice((45, 65, 90, 135, 180)))
+                if rand.random() < 0.25:
+                    f.write('<scale>%s</scale>' % rand.choice((0.5, 0.75, 1.5)))
+                f.write('</item>')
+            f.write('</aestheticlayer>')
+        f.write('</layers></map>')
+
+
+if __name__ == '__main__':
+    parser = OptionParser(usage="usage: %prog [options] OUTFILE")
+    parser.add_option("-l", "--lines", dest="lines", type="int", default=1000,
+                        help="number of terrain lines")
+    parser.add_option("-o", "--objects", dest="objects", type="int", default=1000,
+                        help="number of object layer items")
+    parser.add_option("-a", "--aesthetics", dest="aesthetics", type="int", default=1000,
+                        help="number of aesthetic layer items")
+    parser.add_option("-s", "--seed", dest="seed", type="int", default=0,
+                        help="random seed")
+    (options, args) = parser.parse_args()
+    if len(args) != 1:
+        parser.error("output file required")
+    generate(args[0], options.lines, options.objects, options.aesthetics, options.seed)
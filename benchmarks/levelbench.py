@@ -0,0 +1,138 @@
+'''
+Level load/save benchmark.
+
+Generates synthetic levels of increasing size and times the scene
+graph load, physics, save and focus paths plus a LevelScene update
+step, writing the results as json so runs of different releases can
+be compared.
+
+run from the project root:
+    python2 -m benchmarks.levelbench [options]
+'''
+import os
+import json
+import time
+import shutil
+import tempfile
+import platform
+from timeit import default_timer as clock
+from optparse import OptionParser
+
+import pyglet
+pyglet.options['debug_gl'] = False
+import pymunk
+import appEngine
+from appEngine import rLoader, levelfile
+from appEngine.scenegraph import SceneGraph
+from appEngine.scene import LevelScene
+from benchmarks import genlevel
+
+VIEWPORT = (1280, 720)
+DEFAULT_SIZES = "1000,10000,100000"
+# focus positions timed when sweeping the camera over a level
+FOCUS_STEPS = 200
+UPDATE_STEPS = 10
+
+
+def timed(func, *args, **kwargs):
+    ''' returns (seconds taken, result) of calling func '''
+    start = clock()
+    result = func(*args, **kwargs)
+    return clock() - start, result
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+def benchGraph(filename, results):
+    batch = pyglet.graphics.Batch()
+    compiled = levelfile.compiledPath(filename)
+    if os.path.exists(compiled):
+        os.remove(compiled)
+    results['parseMapFile'], graph = timed(SceneGraph.parseMapFile,
+        filename, batch, rLoader, VIEWPORT)
+    graph.unload(False)
+    # second load reads the sidecar written by the first
+    batch = pyglet.graphics.Batch()
+    results['parseMapFileCached'], graph = timed(SceneGraph.parseMapFile,
+        filename, batch, rLoader, VIEWPORT)
+    graph.space = pymunk.Space()
+    results['generatePhysics'], _ = timed(graph.generatePhysics)
+    saveName = filename + ".saved.lvl"
+    results['saveToFile'], _ = timed(graph.saveToFile, saveName)
+    os.remove(saveName)
+    # sweep focus across the level
+    span = max(graph.width - VIEWPORT[0], 1)
+    times = []
+    for i in xrange(FOCUS_STEPS):
+        x = -span * i / FOCUS_STEPS
+        t, _ = timed(graph.setFocus, x, -(i % 3) * 50)
+        times.append(t)
+    results['setFocus'] = median(times)
+    results['setFocusMax'] = max(times)
+    graph.unload(False)
+
+def benchScene(filename, results):
+    from game.robot import Robot
+    robot = Robot(None)
+    scene = LevelScene("bench", filename, robot, VIEWPORT)
+    results['LevelScene.load'], _ = timed(scene.load)
+    times = []
+    for i in xrange(UPDATE_STEPS):
+        t, _ = timed(scene.update, 1/60.)
+        times.append(t)
+    results['LevelScene.update'] = median(times)
+    results['actors'] = len(scene.actors)
+    scene.graph.unload(False)
+    for actor in scene.actors:
+        actor.unload()
+
+def run(sizes, outFile, keepLevels=False):
+    workDir = tempfile.mkdtemp(prefix="levelbench")
+    report = {
+        'engineVersion': appEngine.version,
+        'python': platform.python_version(),
+        'pyglet': pyglet.version,
+        'platform': platform.platform(),
+        'time': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'results': [],
+    }
+    try:
+        for size in sizes:
+            filename = os.path.join(workDir, "bench%d.lvl" % size)
+            genlevel.generate(filename, size, size, size)
+            results = {
+                'lines': size,
+                'objects': size,
+                'aesthetics': size,
+                'fileBytes': os.path.getsize(filename),
+            }
+            print "level size %d" % size
+            benchGraph(filename, results)
+            benchScene(filename, results)
+            for key in sorted(results):
+                print "    %-20s %s" % (key, results[key])
+            report['results'].append(results)
+            # write as we go so a crash on a large size keeps the rest
+            with open(outFile, 'w') as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+    finally:
+        if keepLevels:
+            print "levels kept in " + workDir
+        else:
+            shutil.rmtree(workDir)
+    return report
+
+
+if __name__ == '__main__':
+    parser = OptionParser()
+    parser.add_option("-s", "--sizes", dest="sizes", default=DEFAULT_SIZES,
+                        help="comma separated item counts to generate, up to 1000000")
+    parser.add_option("-o", "--out", dest="out", default="levelbench.json",
+                        help="json file to write results to")
+    parser.add_option("-k", "--keep", dest="keep", default=False, action="store_true",
+                        help="keep the generated levels")
+    (options, args) = parser.parse_args()
+    appEngine.setResourcePath(["assets"])
+    sizes = [int(s) for s in options.sizes.split(",")]
+    run(sizes, options.out, options.keep)
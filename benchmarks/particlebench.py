@@ -0,0 +1,89 @@
+'''
+Particle engine benchmark.
+
+Runs a number of emitters from one ParticlePool until they hold
+the requested particle count between them, then times updating
+every emitter, writing the results as json.
+
+run from the project root:
+    python2 -m benchmarks.particlebench [options]
+'''
+import json
+import time
+import platform
+from timeit import default_timer as clock
+from optparse import OptionParser
+
+import pyglet
+pyglet.options['debug_gl'] = False
+import numpy
+import appEngine
+from appEngine.particles import EmitterDef, ParticlePool
+
+DEFAULT_COUNTS = "1000,10000,50000"
+EMITTER_CAPACITY = 5000
+WARMUP_STEPS = 30
+STEPS = 120
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+def benchCount(count):
+    numpy.random.seed(0)
+    batch = pyglet.graphics.Batch()
+    pool = ParticlePool(batch, limit=count)
+    # long lived particles spawned fast, so the pool stays at its
+    # limit and every emitter is full or close to it
+    definition = EmitterDef(rate=EMITTER_CAPACITY * 2, life=(1., 2.),
+        speed=(20., 200.), gravity=(0., -100.), capacity=EMITTER_CAPACITY)
+    emitters = [pool.acquire(definition, i * 100, 0)
+        for i in xrange(max(1, count // EMITTER_CAPACITY))]
+    for i in xrange(WARMUP_STEPS):
+        for emitter in emitters:
+            emitter.update(1/60.)
+    times = []
+    for i in xrange(STEPS):
+        start = clock()
+        for emitter in emitters:
+            emitter.update(1/60.)
+        times.append(clock() - start)
+    result = {
+        'particles': count,
+        'emitters': len(emitters),
+        'live': pool.live,
+        'update': median(times),
+        'updateMax': max(times),
+    }
+    pool.clear()
+    return result
+
+def run(counts, outFile):
+    report = {
+        'engineVersion': appEngine.version,
+        'python': platform.python_version(),
+        'numpy': numpy.__version__,
+        'platform': platform.platform(),
+        'time': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'results': [],
+    }
+    for count in counts:
+        result = benchCount(count)
+        print "%6d particles, %d emitters, %d live, update %.6f max %.6f" % (count,
+            result['emitters'], result['live'], result['update'], result['updateMax'])
+        report['results'].append(result)
+        with open(outFile, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    return report
+
+
+if __name__ == '__main__':
+    parser = OptionParser()
+    parser.add_option("-n", "--particles", dest="counts", default=DEFAULT_COUNTS,
+                        help="comma separated particle counts to time")
+    parser.add_option("-o", "--out", dest="out", default="particlebench.json",
+                        help="json file to write results to")
+    (options, args) = parser.parse_args()
+    counts = [int(s) for s in options.counts.split(",")]
+    run(counts, options.out)
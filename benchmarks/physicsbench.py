@@ -0,0 +1,143 @@
+'''
+Physics broadphase benchmark.
+
+Loads synthetic levels of increasing size with every terrain
+segment in the space, drops a number of balls onto them and times
+space steps under each broadphase setting, writing the results as
+json.
+
+run from the project root:
+    python2 -m benchmarks.physicsbench [options]
+
+settings are comma separated, each one of
+    bbtree              chipmunk's bounding box tree
+    hash                spatial hash tuned from the level
+    hash:SIZE[:COUNT]   spatial hash with given cell size and count
+'''
+import os
+import json
+import time
+import random
+import shutil
+import tempfile
+import platform
+from timeit import default_timer as clock
+from optparse import OptionParser
+
+import pyglet
+pyglet.options['debug_gl'] = False
+import pymunk
+import appEngine
+from appEngine import rLoader
+from appEngine.broadphase import Broadphase, BBTREE, SPATIAL_HASH
+from appEngine.scenegraph import SceneGraph
+from benchmarks import genlevel
+
+VIEWPORT = (1280, 720)
+DEFAULT_SIZES = "1000,10000,100000"
+DEFAULT_SETTINGS = "bbtree,hash,hash:64,hash:256,hash:1024"
+WARMUP_STEPS = 30
+STEPS = 120
+BALL_RADIUS = 10
+
+
+def parseSetting(text):
+    parts = text.split(":")
+    if parts[0] == BBTREE:
+        return Broadphase(BBTREE)
+    if parts[0] != SPATIAL_HASH or len(parts) > 3:
+        raise ValueError("bad broadphase setting %r" % text)
+    size = count = None
+    if len(parts) > 1:
+        size = int(parts[1])
+    if len(parts) > 2:
+        count = int(parts[2])
+    return Broadphase(SPATIAL_HASH, size, count)
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+def addBalls(space, width, height, count, seed=0):
+    rand = random.Random(seed)
+    moment = pymunk.moment_for_circle(1, 0, BALL_RADIUS)
+    for i in xrange(count):
+        body = pymunk.Body(1, moment)
+        body.position = rand.uniform(0, width), rand.uniform(height / 2, height)
+        shape = pymunk.Circle(body, BALL_RADIUS)
+        shape.friction = 0.5
+        space.add(body, shape)
+
+def benchSetting(filename, setting, balls):
+    space = pymunk.Space()
+    space.gravity = 0, -1000
+    batch = pyglet.graphics.Batch()
+    start = clock()
+    graph = SceneGraph.parseMapFile(filename, batch, rLoader, VIEWPORT,
+        space=space, broadphase=setting)
+    loadTime = clock() - start
+    addBalls(space, graph.width, graph.height, balls)
+    for i in xrange(WARMUP_STEPS):
+        space.step(1/60.)
+    times = []
+    for i in xrange(STEPS):
+        start = clock()
+        space.step(1/60.)
+        times.append(clock() - start)
+    result = {
+        'broadphase': list(setting.applied),
+        'segments': len(graph.platformSegs),
+        'load': loadTime,
+        'step': median(times),
+        'stepMax': max(times),
+    }
+    graph.unload(False)
+    return result
+
+def run(sizes, settings, balls, outFile):
+    workDir = tempfile.mkdtemp(prefix="physicsbench")
+    report = {
+        'engineVersion': appEngine.version,
+        'python': platform.python_version(),
+        'pymunk': pymunk.version,
+        'platform': platform.platform(),
+        'time': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'balls': balls,
+        'results': [],
+    }
+    try:
+        for size in sizes:
+            filename = os.path.join(workDir, "bench%d.lvl" % size)
+            genlevel.generate(filename, size, 0, 0)
+            print "level size %d" % size
+            for text in settings:
+                result = benchSetting(filename, parseSetting(text), balls)
+                result['lines'] = size
+                result['setting'] = text
+                print "    %-16s step %.6f max %.6f %s" % (text, result['step'],
+                    result['stepMax'], result['broadphase'])
+                report['results'].append(result)
+                with open(outFile, 'w') as f:
+                    json.dump(report, f, indent=2, sort_keys=True)
+    finally:
+        shutil.rmtree(workDir)
+    return report
+
+
+if __name__ == '__main__':
+    parser = OptionParser()
+    parser.add_option("-s", "--sizes", dest="sizes", default=DEFAULT_SIZES,
+                        help="comma separated terrain line counts to generate")
+    parser.add_option("-b", "--broadphase", dest="settings", default=DEFAULT_SETTINGS,
+                        help="comma separated broadphase settings to compare")
+    parser.add_option("-n", "--balls", dest="balls", type="int", default=200,
+                        help="dynamic bodies dropped onto each level")
+    parser.add_option("-o", "--out", dest="out", default="physicsbench.json",
+                        help="json file to write results to")
+    (options, args) = parser.parse_args()
+    appEngine.setResourcePath(["assets"])
+    sizes = [int(s) for s in options.sizes.split(",")]
+    settings = options.settings.split(",")
+    for text in settings:
+        parseSetting(text)
+    run(sizes, settings, options.balls, options.out)
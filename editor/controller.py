@@ -86,10 +86,6 @@ class PanTool(BaseTool):
     PlotLineTool
     allows user to place a line in the terrain layer. 
 '''
-class Point(object):
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
 class PlotLineTool(BaseTool):
     NAME = "Line"
     def __init__(self, controller):
@@ -116,27 +112,13 @@ class PlotLineTool(BaseTool):
                 ('c3f', (curColor[0],curColor[1],curColor[2])*2))
             
     def closestPointToMouse(self):
-        lines = self.controller.graph.layers["terrain"].lines
+        terrain = self.controller.graph.layers["terrain"]
         mousePos = self.screenToSceneCoords(self.mousePoint[0],self.mousePoint[1])
-        closestPoint = None
-        
-        points = list()
-        for line in lines:
-            #create list of points
-            points.append(Point(line.x1, line.y1))
-            points.append(Point(line.x2, line.y2))
-        for point in points:
-            # calcuate distance between mouse and point
-            xDist = abs(mousePos[0] - point.x)
-            yDist = abs(mousePos[1] - point.y)
-            dist = xDist + yDist
-            if closestPoint == None:
-                closestDist = dist
-                closestPoint = point
-            if dist < closestDist:
-                closestDist = dist
-                closestPoint = point
-        return (closestPoint.x, closestPoint.y)
+        closestPoint = terrain.nearestEndpoint(mousePos)
+        if closestPoint is None:
+            # nothing to snap to yet
+            return mousePos
+        return closestPoint
         
     def on_mouse_drag(self, x, y, dx, dy, buttons, modifiers):
         self.doPreview(x,y)
@@ -249,7 +231,10 @@ class SelectTool(BaseTool):
     def on_mouse_drag(self, x, y, dx, dy, buttons, modifiers):
         currentLayer = self.controller.currentLayer
         if currentLayer.name == "terrain":
-            pass
+            line = self.selectedItem
+            if line is not None:
+                line.updatePos(line.x1 + dx, line.y1 + dy, line.x2 + dx, line.y2 + dy)
+                self.controller.edited = True
         else:
             if self.selectedItem is not None:
                 x = self.selectedItem.x + dx
@@ -284,7 +269,18 @@ class SelectTool(BaseTool):
         self.mousePoint = self.screenToSceneCoords(x, y)
         self.selectedItem = self.controller.currentLayer.isPointOverItem(self.mousePoint, 5)
         self.window.dispatch_event('on_select_item')
-        
+
+    def key_press(self, symbol, modifiers):
+        if symbol == key.DELETE and self.selectedItem is not None:
+            currentLayer = self.controller.currentLayer
+            if currentLayer.name == "terrain":
+                currentLayer.removeLine(self.selectedItem)
+            else:
+                currentLayer.removeItem(self.selectedItem)
+            self.selectedItem = None
+            self.controller.edited = True
+            self.window.dispatch_event('on_select_item')
+
 
 
 '''
@@ -395,7 +391,7 @@ class Controller(object):
     edited = property(_get_edited, _set_edited)
         
     def addLayer(self, name, z_order):
-        self.graph.addAestheticLayer(self, name, z_order)
+        self.graph.addAestheticLayer(name, z_order)
         self.edited = True
         
     def deleteLayer(self, name):
@@ -444,6 +440,7 @@ class Controller(object):
         self.graph = SceneGraph(name, self.batch, rLoader, self.size, width, height, editorMode=True)
         self.levelFilename = None
         self.graph.forceFocus = True
+        self.graph.setViewScale(self.scale)
         self.edited = False
     
     def loadLevel(self, filename, window):
@@ -453,6 +450,7 @@ class Controller(object):
         self.grid.update()
         self.graph = SceneGraph.parseMapFile(filename, self.batch, rLoader, self.size, editorMode=True)
         self.graph.forceFocus = True
+        self.graph.setViewScale(self.scale)
         self.levelFilename = filename
         window.dispatch_event('on_layer_update')
         self.edited = False
@@ -492,6 +490,13 @@ class Controller(object):
         if self.graph:
             self.graph.viewportWidth = width
             self.graph.viewportHeight = height
+            self.graph.updateView()
+            
+    def setScale(self, scale):
+        self.scale = scale
+        if self.graph:
+            self.graph.setViewScale(scale)
+        self.window.dispatch_event('on_update_zoom')
             
     def update(self, dt):
         if self.graph:
@@ -524,16 +529,13 @@ class Controller(object):
                 self.graph.setFocus(0,0)
                 return
         elif modifiers & key.MOD_CTRL and symbol == key._0:
-            self.scale = 1.0
-            self.window.dispatch_event('on_update_zoom')
+            self.setScale(1.0)
             return
         elif modifiers & key.MOD_CTRL and symbol == key.MINUS:
-            self.scale = self.scale - 0.1
-            self.window.dispatch_event('on_update_zoom')
+            self.setScale(self.scale - 0.1)
             return
         elif modifiers & key.MOD_CTRL and symbol == key.EQUAL:
-            self.scale = self.scale + 0.1
-            self.window.dispatch_event('on_update_zoom')
+            self.setScale(self.scale + 0.1)
             return
         elif modifiers & key.MOD_CTRL and symbol == key.S:
             if self.levelFilename is not None and self.edited is not False:
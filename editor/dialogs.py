@@ -492,12 +492,12 @@ class StatusPane(Dialog):
         self.editedLabel.set_text(text)
 
     def createLayout(self):
+        # setScale updates the graph's view scale and cull rect, and
+        # the label through on_update_zoom
         def z_minus():
-            self.controller.scale = self.controller.scale - 0.1
-            self.zoomLabel.set_text(str(self.controller.scale))
+            self.controller.setScale(self.controller.scale - 0.1)
         def z_add():
-            self.controller.scale = self.controller.scale + 0.1
-            self.zoomLabel.set_text(str(self.controller.scale))
+            self.controller.setScale(self.controller.scale + 0.1)
         self.xLabel = Label("X:")
         self.yLabel = Label("Y:")
         self.zoomLabel = Label("1.0")
@@ -0,0 +1,138 @@
+'''
+Fly-through benchmark.
+
+Loads a level and sweeps the view from its bottom left corner to its
+top right with a ContinuousCamera, timing every frame. The sweep
+moves the same distance each frame, so a run always draws the same
+views in the same order whatever the frame rate. Frame time
+percentiles and hitch counts are written to a json or csv report.
+'''
+import os
+import csv
+import math
+import json
+import time
+import platform
+import pyglet
+import appEngine
+from appEngine import director
+from appEngine import scene
+from robot import Robot
+
+# frames run before the sweep starts, while loading settles
+WARMUP_FRAMES = 30
+# frames run a second when no fps limit is set
+DEFAULT_RATE = 60
+# frame times over these many milliseconds are counted as hitches
+HITCH_MS = (1000 / 30., 100.)
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values, p):
+    ''' nearest rank percentile of sorted values '''
+    index = int(math.ceil(p / 100. * len(values))) - 1
+    return values[max(0, min(index, len(values) - 1))]
+
+def summarize(frameTimes):
+    ''' returns dict of frame time statistics in milliseconds '''
+    times = sorted(t * 1000 for t in frameTimes)
+    stats = {
+        'frames': len(times),
+        'mean': sum(times) / len(times),
+        'max': times[-1],
+    }
+    for p in PERCENTILES:
+        stats['p%d' % p] = percentile(times, p)
+    for ms in HITCH_MS:
+        stats['hitches%d' % round(ms)] = sum(1 for t in times if t > ms)
+    return stats
+
+def writeReport(report, filename):
+    '''
+        writes report as json, or for a .csv file name appends a row
+        of its summary, writing the header when the file is new
+    '''
+    if filename.lower().endswith('.csv'):
+        row = dict((key, value) for key, value in report.iteritems()
+            if key != 'frameTimes')
+        fields = sorted(row)
+        isNew = not os.path.exists(filename)
+        with open(filename, 'ab') as f:
+            writer = csv.DictWriter(f, fields)
+            if isNew:
+                writer.writerow(dict(zip(fields, fields)))
+            writer.writerow(row)
+    else:
+        with open(filename, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+
+class Benchmark(object):
+    width = 1280
+    height = 720
+    def __init__(self, options):
+        if options.fps > 0:
+            pyglet.clock.set_fps_limit(options.fps)
+            self.rate = options.fps
+        else:
+            self.rate = DEFAULT_RATE
+        self.level = options.benchmark
+        self.duration = options.duration
+        self.reportFile = options.report
+        appEngine.setResourcePath(["assets", "entities", "assets\avatar"])
+        self.director = director.Director((self.width, self.height), options.showfps,
+            windowCaption="Benchmark")
+        robo = Robot(self.director)
+        self.scene = scene.LevelScene("benchmark", self.level, robo, (self.width, self.height),
+            streaming=options.stream)
+        self.director.registerScene(self.scene)
+        self.director.push_handlers(on_load_complete=self.start)
+        self.frameCount = int(self.duration * self.rate)
+        self.frameTimes = []
+        self.warmup = WARMUP_FRAMES
+        self.startTime = None
+        self.director.loadScene("benchmark")
+
+    def start(self, sceneName):
+        # view held at the start of the sweep through the warmup
+        self.scene.camera = None
+        self.scene.graph.setFocus(0, 0)
+        pyglet.clock.schedule(self.tick)
+
+    def tick(self, dt):
+        if self.warmup > 0:
+            self.warmup -= 1
+            if self.warmup == 0:
+                graph = self.scene.graph
+                # whole map crossed in the benchmark's frames
+                incX = max(0, graph.width - self.width) / float(self.frameCount)
+                incY = max(0, graph.height - self.height) / float(self.frameCount)
+                self.scene.camera = scene.ContinuousCamera(self.scene, incX, incY)
+                self.startTime = time.time()
+            return
+        self.frameTimes.append(dt)
+        if len(self.frameTimes) >= self.frameCount:
+            pyglet.clock.unschedule(self.tick)
+            self.finish(time.time() - self.startTime)
+
+    def finish(self, wallTime):
+        report = summarize(self.frameTimes)
+        report.update({
+            'level': self.level,
+            'wallTime': wallTime,
+            'engineVersion': appEngine.version,
+            'python': platform.python_version(),
+            'pyglet': pyglet.version,
+            'platform': platform.platform(),
+            'time': time.strftime("%Y-%m-%dT%H:%M:%S"),
+            'frameTimes': [t * 1000 for t in self.frameTimes],
+        })
+        writeReport(report, self.reportFile)
+        print "%s: %d frames in %.1fs, p50 %.2fms p95 %.2fms p99 %.2fms max %.2fms" % (
+            self.level, report['frames'], wallTime, report['p50'], report['p95'],
+            report['p99'], report['max'])
+        print "hitches: " + ", ".join("%d over %dms" % (report['hitches%d' % round(ms)], round(ms))
+            for ms in HITCH_MS)
+        print "report written to %s" % self.reportFile
+        self.director.close()
+        pyglet.app.exit()
@@ -0,0 +1,208 @@
+'''
+Pooled projectiles.
+
+Every live bullet is a few entries in flat arrays rather than an
+actor of its own, so thousands of them cost no bodies, sprites or
+scene bookkeeping. The pool moves them all in one pass, draws them
+from one shared vertex list and finds hits with a segment query
+along each bullet's path through the step.
+'''
+from array import array
+from pyglet.gl import GL_QUADS
+from appEngine import actor
+from appEngine.particles import EmitterDef
+
+BULLET_SPEED = 900.
+BULLET_LIFETIME = 2.
+BULLET_SIZE = 3
+BULLET_COLOR = (255, 230, 120, 255)
+# impulse given to dynamic bodies hit, along the bullet's direction
+HIT_IMPULSE = 0.4
+# burst of sparks where a bullet hits
+SPARKS = EmitterDef(rate=0, burst=12, duration=0.05, life=(0.15, 0.35),
+    speed=(60., 180.), gravity=(0., -600.), size=1.5,
+    startColor=(255, 240, 160, 255), endColor=(255, 90, 20, 0), capacity=64)
+
+
+'''
+    class BulletPool
+    holds every live bullet of a scene. live bullets are packed at
+    the front of the arrays, a dead one is replaced by the last.
+'''
+class BulletPool(actor.Actor):
+    CAPACITY = 256
+    tickRate = actor.TickRate.EVERY_FRAME
+
+    def __init__(self, capacity=CAPACITY, lifetime=BULLET_LIFETIME, size=BULLET_SIZE,
+        color=BULLET_COLOR, group=0, layers=-1):
+        self.capacity = 0
+        self.count = 0
+        self.lifetime = lifetime
+        self.size = size
+        self.color = color
+        # query filter, shapes sharing a nonzero group aren't hit
+        self.group = group
+        self.layers = layers
+        self.xs = array('f')
+        self.ys = array('f')
+        self.vxs = array('f')
+        self.vys = array('f')
+        self.ages = array('f')
+        self.space = None
+        self.vl = None
+        self.drawnCount = 0
+        self.bounds = None
+        self.grow(capacity)
+
+    def addedToScene(self, scene):
+        super(BulletPool, self).addedToScene(scene)
+        graph = getattr(scene, 'graph', None)
+        bounds = None
+        if graph is not None:
+            bounds = (0, 0, graph.width, graph.height)
+        self.attach(scene.space, scene.batch, getattr(scene, 'actorGroup', None), bounds)
+
+    def removedFromScene(self, scene):
+        super(BulletPool, self).removedFromScene(scene)
+        self.unload()
+        if self.vl is not None:
+            self.vl.delete()
+            self.vl = None
+
+    '''
+        gives pool the space to query and the batch and group to
+        draw in. bullets leaving bounds (x1, y1, x2, y2) are dropped.
+    '''
+    def attach(self, space, batch, group=None, bounds=None):
+        self.space = space
+        self.bounds = bounds
+        if self.vl is not None:
+            self.vl.delete()
+        self.vl = batch.add(self.capacity * 4, GL_QUADS, group,
+            'v2f/stream', ('c4B/static', self.color * (self.capacity * 4)))
+        # a new list's vertices are whatever its buffer held, blank
+        # them and place any live bullets before it is drawn
+        self.vl.vertices[:] = [0.] * (self.capacity * 8)
+        self.drawnCount = 0
+        self.updateVertices()
+
+    def unload(self):
+        # the scene keeps its actors to load again, so the vertex list
+        # stays attached and only the drawn bullets are blanked
+        self.count = 0
+        self.updateVertices()
+
+    def grow(self, capacity):
+        extra = capacity - self.capacity
+        if extra <= 0:
+            return
+        zeros = array('f', (0.,)) * extra
+        for values in (self.xs, self.ys, self.vxs, self.vys, self.ages):
+            values.extend(zeros)
+        if self.vl is not None:
+            self.vl.resize(capacity * 4)
+            self.vl.vertices[self.capacity * 8:] = [0.] * (extra * 8)
+            self.vl.colors[self.capacity * 16:] = self.color * (extra * 4)
+        self.capacity = capacity
+
+    def fire(self, x, y, vx, vy):
+        ''' adds a bullet at x,y moving at vx,vy per second '''
+        i = self.count
+        if i == self.capacity:
+            self.grow(self.capacity * 2)
+        self.xs[i] = x
+        self.ys[i] = y
+        self.vxs[i] = vx
+        self.vys[i] = vy
+        self.ages[i] = 0.
+        self.count = i + 1
+        # the slot's quad may still be a dead bullet's, drawn until
+        # the next update if left
+        if self.vl is not None:
+            s = self.size
+            self.vl.vertices[i * 8:i * 8 + 8] = [x - s, y - s, x + s, y - s,
+                x + s, y + s, x - s, y + s]
+            self.drawnCount = max(self.drawnCount, self.count)
+
+    def kill(self, i):
+        last = self.count - 1
+        if i != last:
+            self.xs[i] = self.xs[last]
+            self.ys[i] = self.ys[last]
+            self.vxs[i] = self.vxs[last]
+            self.vys[i] = self.vys[last]
+            self.ages[i] = self.ages[last]
+        self.count = last
+
+    def onHit(self, i, info):
+        '''
+            called with bullet index and the pymunk SegmentQueryInfo
+            of what it hit, returns whether the bullet is spent
+        '''
+        body = info.shape.body
+        scene = getattr(self, 'scene', None)
+        if body is not None and not body.is_static:
+            body.activate()
+            body.apply_impulse((self.vxs[i] * HIT_IMPULSE, self.vys[i] * HIT_IMPULSE))
+            # the hit actor reacts on the next tick whatever its rate
+            hit = getattr(body, 'actor', None)
+            if hit is not None and scene is not None:
+                scene.scheduler.wake(hit)
+        if getattr(scene, 'particles', None) is not None:
+            x, y = info.get_hit_point()
+            scene.addActor(actor.EffectActor(SPARKS, x, y))
+        return True
+
+    def update(self, dt):
+        xs, ys, vxs, vys, ages = self.xs, self.ys, self.vxs, self.vys, self.ages
+        query = None
+        if self.space is not None:
+            query = self.space.segment_query_first
+        layers, group = self.layers, self.group
+        lifetime = self.lifetime
+        if self.bounds is not None:
+            bx1, by1, bx2, by2 = self.bounds
+        else:
+            bx1 = by1 = float('-inf')
+            bx2 = by2 = float('inf')
+        i = 0
+        # walked from the front, a killed bullet's slot is refilled
+        # from the back and checked again without advancing
+        while i < self.count:
+            age = ages[i] + dt
+            x = xs[i]
+            y = ys[i]
+            nx = x + vxs[i] * dt
+            ny = y + vys[i] * dt
+            if age > lifetime or nx < bx1 or nx > bx2 or ny < by1 or ny > by2:
+                self.kill(i)
+                continue
+            if query is not None:
+                info = query((x, y), (nx, ny), layers, group)
+                if info is not None and self.onHit(i, info):
+                    self.kill(i)
+                    continue
+            xs[i] = nx
+            ys[i] = ny
+            ages[i] = age
+            i += 1
+        self.updateVertices()
+
+    def updateVertices(self):
+        ''' writes the quads of live bullets, collapsing ones that died '''
+        if self.vl is None:
+            return
+        s = self.size
+        xs, ys = self.xs, self.ys
+        vertices = [0.] * (self.count * 8)
+        for i in xrange(self.count):
+            x = xs[i]
+            y = ys[i]
+            j = i * 8
+            vertices[j:j + 8] = (x - s, y - s, x + s, y - s, x + s, y + s, x - s, y + s)
+        drawn = max(self.drawnCount, self.count)
+        if drawn > self.count:
+            vertices.extend([0.] * ((drawn - self.count) * 8))
+        if drawn > 0:
+            self.vl.vertices[:drawn * 8] = vertices
+        self.drawnCount = self.count
@@ -14,12 +14,17 @@ class Game(object):
     width = 1280
     height = 720
     def __init__(self, options):
-        pyglet.clock.set_fps_limit(60)
+        if options.fps > 0:
+            pyglet.clock.set_fps_limit(options.fps)
         appEngine.setResourcePath(["assets", "entities", "assets\avatar"])
-        self.director = director.Director((self.width, self.height), True, windowCaption="Game")
+        self.director = director.Director((self.width, self.height), options.showfps,
+            windowCaption="Game")
         robo = Robot(self.director)
         self.director.push_handlers(robo.keyboard)
         lvlpath = os.path.join("assets", "levels", "level.lvl")
-        scene = appEngine.scene.LevelScene("scene", lvlpath, robo, (self.width, self.height))
+        scene = appEngine.scene.LevelScene("scene", lvlpath, robo, (self.width, self.height),
+            streaming=options.stream)
         self.director.registerScene(scene)
-        self.director.switchToScene("scene")
+        # the level's images load in the background behind a
+        # loading display, then the scene is switched to
+        self.director.loadScene("scene")
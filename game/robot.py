@@ -9,10 +9,8 @@ from pyglet.window import key
 import pymunk
 from pymunk.vec2d import Vec2d
 import appEngine
-from appEngine import rLoader
 from appEngine.director import Director
 from appEngine.avatar import Avatar
-from appEngine.actor import centerImgAnchor
 from appEngine import keyboard
 from appEngine.actor import Direction, State
 
@@ -36,17 +34,12 @@ HEAD_FRICTION = 0.7
 
 JUMP_TIMES = 2
 
+SHEET = "avatar/zombie.png"
+STAND_FRAME = (0, 0, 82, 106)
+
 class Robot(Avatar):
     def __init__(self, window, batch=None):
-        states = dict()
-        standR = rLoader.image("avatar/zombie.png").get_region(0, 0, 82, 106).get_texture()
-        standL = rLoader.image("avatar/zombie.png").get_region(0, 0, 82, 106).get_texture().get_transform(flip_x=True)
-        centerImgAnchor(standL)
-        centerImgAnchor(standR)
-        states[State.STAND] = State(State.STAND, standL, standR)
-        walkR = self.loadAnimation("avatar/zombie.png", 1, 4, 0.1, True, True)
-        walkL = self.loadAnimation("avatar/zombie.png", 1, 4, 0.1, True, True).get_transform(flip_x=True)
-        states[State.WALK] = State(State.WALK, walkL, walkR)
+        states = appEngine.frames.states(Robot, self.buildStates)
         super(Avatar, self).__init__(states, State.STAND, batch)
         self.window = window
         self.keyboard = keyboard.Keyboard()
@@ -58,12 +51,24 @@ class Robot(Avatar):
         self.remaining_jumps = 0
 
         
+    def buildStates(self):
+        frames = appEngine.frames
+        states = dict()
+        standR = frames.image(SHEET, STAND_FRAME, centerAnchor=True)
+        standL = frames.image(SHEET, STAND_FRAME, flipX=True, centerAnchor=True)
+        states[State.STAND] = State(State.STAND, standL, standR)
+        walkR = self.loadAnimation(SHEET, 1, 4, 0.1, True, True)
+        walkL = self.loadAnimation(SHEET, 1, 4, 0.1, True, True, flipX=True)
+        states[State.WALK] = State(State.WALK, walkL, walkR)
+        return states
+        
     def initPhysics(self):
         self.feet = pymunk.Circle(self.body, 20)
         self.mid = pymunk.Circle(self.body, 20, (0,40))
         self.head = pymunk.Circle(self.body, 20, (0,75))
         self.feet.collisionType = platform_collType
         self.feet.elasticity = 1.
+        self.shapes.extend((self.feet, self.mid, self.head))
         
         self.platformNormal = Vec2d.zero()
         self.platformBody = None
@@ -72,9 +77,6 @@ class Robot(Avatar):
 
     def addedToScene(self, scene):
         super(Avatar, self).addedToScene(scene)
-        scene.space.add(self.feet)
-        scene.space.add(self.mid)
-        scene.space.add(self.head)
         scene.avatar = self
         self.scene = scene
         
@@ -86,9 +88,6 @@ class Robot(Avatar):
         if symbol == key.UP:
             self.jumpTrigger = True
 
-    def setposition(self,x,y):
-        self.body.position = x,y
-
     def update(self, dt):
         def f(arbiter):
             n = -arbiter.contacts[0].normal
@@ -109,6 +108,11 @@ class Robot(Avatar):
             self.remaining_jumps = JUMP_TIMES
             ground_velocity = self.platformBody.velocity
             
+        # input has to wake the body, setting its velocity won't
+        if self.jumpTrigger or self.keyboard[key.LEFT] or self.keyboard[key.RIGHT] \
+            or self.keyboard[key.DOWN]:
+            self.body.activate()
+            
         # control inputs
         targetXVel = 0
         if self.keyboard[key.LEFT]:
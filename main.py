@@ -18,6 +18,22 @@ parser.add_option("-d", "--debug", dest="debug", default=False, action="store_tr
 					help="run in debug mode")
 parser.add_option("-r", "--showfps", dest="showfps", default=False, action="store_true",
 					help="show frame rate per second")
+parser.add_option("-f", "--fps", dest="fps", type="int", default=60,
+					help="frame rate limit, 0 for none. physics runs at 60Hz regardless")
+parser.add_option("-s", "--stream", dest="stream", default=False, action="store_true",
+					help="stream level terrain and items in chunks around the view")
+parser.add_option("-b", "--benchmark", dest="benchmark", default=None, metavar="LEVEL",
+					help="sweep the view across LEVEL, timing every frame")
+parser.add_option("--duration", dest="duration", type="float", default=20.,
+					help="seconds the benchmark sweep takes at the fps limit")
+parser.add_option("--report", dest="report", default="benchmark.json",
+					help="benchmark report file, .json or .csv")
+parser.add_option("-p", "--profile", dest="profile", default=None, metavar="PREFIX",
+					help="profile the run, writing PREFIX-TIME.pstats and .collapsed stacks")
+parser.add_option("--profile-slowest", dest="profileSlowest", type="int", default=0, metavar="N",
+					help="profile only the N slowest frames")
+parser.add_option("-t", "--trace", dest="trace", default=None, metavar="FILE",
+					help="record a chrome trace timeline to FILE, written on exit or F4")
 
 (options, args) = parser.parse_args()
 
@@ -26,9 +42,22 @@ if __name__ == '__main__':
 		import pyglet
 		pyglet.options['debug_gl'] = False
 		
+	if options.trace is not None:
+		from appEngine.trace import tracer
+		tracer.start(options.trace)
+		
+	if options.profile is not None:
+		from appEngine.profiling import RunProfiler
+		runLoop = RunProfiler(options.profile, options.profileSlowest).run
+	else:
+		runLoop = lambda run: run()
+		
 	if options.editor == True:
 		from editor import leveleditor
-		leveleditor.LevelEditor(options).run()
+		runLoop(leveleditor.LevelEditor(options).run)
+	elif options.benchmark is not None:
+		from game import benchmark
+		runLoop(benchmark.Benchmark(options).director.run)
 	else:
 		from game import game as g
-		g.Game(options).director.run()
+		runLoop(g.Game(options).director.run)